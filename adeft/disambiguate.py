@@ -280,7 +280,7 @@ class AdeftDisambiguator(object):
                                     value for label, value in
                                     classifier.stats.items()}
 
-    def dump(self, model_name, path=None):
+    def dump(self, model_name, path=None, dtype=None):
         """Save disambiguator to disk
 
         Parameters
@@ -290,6 +290,9 @@ class AdeftDisambiguator(object):
         path : Optional[str]
             Path where model is to be stored. Defaults to current directory.
             Default: None
+        dtype : Optional[str]
+            Either 'float16' or 'float32'. If given, classifier arrays are
+            stored at reduced precision. Default: None
         """
         if path is None:
             path = os.getcwd()
@@ -304,7 +307,8 @@ class AdeftDisambiguator(object):
             os.makedirs(model_path)
 
         classifier.dump_model(os.path.join(model_path,
-                                           '%s_model.gz' % model_name))
+                                           '%s_model.gz' % model_name),
+                              dtype=dtype)
         with open(os.path.join(model_path,
                                '%s_grounding_dict.json'
                                % model_name), 'w') as f:
@@ -1,61 +1,88 @@
 """Discover candidate longforms from a given corpus using the Acromine
 algorithm."""
+import os
+import sys
 import json
+import struct
+import uuid
 import logging
+import heapq
 import numpy as np
-from copy import deepcopy
+from array import array
+from itertools import islice
+from collections import Counter
+from joblib import Parallel, delayed
 
 from adeft.nlp import WatchfulStemmer
 from adeft.score import AlignmentBasedScorer
-from adeft.util import get_candidate_fragments, get_candidate
+from adeft.util import get_candidate_fragments, get_candidate, \
+    get_candidate_fragments_multi, defining_pattern_regex
 
 
 logger = logging.getLogger(__file__)
 
 
-class _TrieNode(object):
-    """Node in Trie associated to a candidate longform
+# Identifies files in the binary AdeftMiner format
+_binary_magic = b'ADEFTMNR'
+_binary_version = 1
 
-    The children of a node associated to a candidate longform c are all
-    observed candidates t that can be obtained by prepending a single token
-    to c.
 
-    Contains the current likelihood for the candidate longform as well
-    as all information needed to calculate it. The likelihood's are
-    updated as candidates are added to the Trie.
+class _CompactTrie(object):
+    """Trie of candidate longforms stored as parallel arrays
 
+    Node i is associated to a candidate longform. The children of a node
+    associated to a candidate longform c are all observed candidates t that
+    can be obtained by prepending a single token to c. Node 0 is the root of
+    the trie and is associated to the empty candidate. Every other node has
+    a larger index than its parent.
 
-    Parameters
-    ----------
-    longform : list of str
-        List of tokens within a candidate longform in reverse order.
-        For the candidate longform "in the endoplasmic reticulum" the
-        list will take the form ["reticulum", "endoplasmic", "the", "in"],
-        ignoring that the tokens should actually be stemmed.
+    The fields of each node are stored in parallel arrays from the array
+    module, which support fast scalar access and can be viewed as numpy
+    arrays without copying. Stemmed tokens are interned as integer ids and
+    longforms are recovered by following parent links. Children are found
+    through a dictionary of edges keyed by parent and token id, and are
+    enumerated through first child and next sibling links.
 
     Attributes
     ----------
+    tokens : list of str
+        Stemmed token associated to each token id
+
+    token_ids : dict
+        Maps stemmed tokens to their token ids
+
+    edges : dict
+        Maps the key (parent << 32) | token_id to the index of the child of
+        parent for the given token.
 
-    longform : list of str
-        Explained above
+    parent : array of int
+        Index of the parent of each node. -1 for the root.
 
-    count : int
+    token : array of int
+        Token id of the token prepended to the parent's candidate to obtain
+        the node's candidate. -1 for the root.
+
+    first_child, last_child, next_sibling : array of int
+        Links used to enumerate the children of each node in the order they
+        were added. -1 if absent.
+
+    count : array of int
         Current co-occurence frequency of candidate longform with shortform
 
-    sum_ft : int
+    sum_ft : array of int
         Sum of the co-occurence frequencies of all previously observed
         candidate longforms that are children of the associated candidate
         longform (longforms that can be obtained by prepending
         one token to the associated candidate longform).
 
-    sum_ft2 : int
+    sum_ft2 : array of int
         Sum of the squares of the co-occurence freqencies of all previously
         observed candidate longforms that are children of the associated
         longform.
 
-    score : float
+    score : array of float
         Likelihood score of the associated candidate longform.
-        It is given by count - sum_ft**2/sum_ft
+        It is given by count - sum_ft2/sum_ft
 
         See
         [Okazaki06] Naoaki Okazaki and Sophia Ananiadou. "Building an
@@ -64,143 +91,408 @@ class _TrieNode(object):
 
         for more information
 
-    parent : :py:class:`adeft.discover._TrieNode`
-        link to node's parent
-
-    children : dict of :py:class:`adeft.discover._TrieNode`
-        dictionary of child nodes
-
-    encoded_tokens : list of list of int
-        Tokens for associated longform candidate encoded in form required
-        by the alignment based scorer.
-
-    word_prizes : list of float
-        Alignment based scorer word prizes for associated longform candidate.
-
-    stop_count : int
-        Count of leading stopwords in parent candidate.
-
-    best_ancestor_align_score : float
-        Best alignment based score for all ancestors of a candidate.
-
-    sum_parent_word_scores : float
-        Sum of word scores for parent candidate.
-
-    best_char_scores : float
-        List of alignment based scorer char_scores for highest alignment
-        based scoring ancestor of node.
-
-    alignment_score : float
+    alignment_score : array of float
         Alignment based score of node. Computed using parameters specified
         when compute_alignment_scores was run. Default parameters are chosen
         if user does not run this function explicitly.
 
-    best_ancestor_score : float
-        Based likelihood score among ancestors of node.
+    best_ancestor_score : array of float
+        Best likelihood score among a node and its ancestors.
 
-    best_descendent_score : float
-        Based likelihood score among descendents of node.
+    best_descendent_score : array of float
+        Best likelihood score among a node and its descendents.
+
+    aligned : array of int
+        1 if the alignment score of a node is up to date, otherwise 0. The
+        parent of an aligned node is always aligned.
+
+    num_propagated : int
+        Best ancestor and descendent scores were last propagated when the
+        trie had this many nodes.
+
+    dirty : set of int
+        Nodes with index less than num_propagated whose likelihood score
+        changed since scores were last propagated.
     """
-    __slots__ = ['longform', 'count', 'sum_ft', 'sum_ft2', 'score',
-                 'parent', 'children', 'encoded_tokens', 'word_prizes',
-                 'best_ancestor_align_score', 'sum_parent_word_scores',
-                 'best_char_scores', 'alignment_score', 'best_ancestor_score',
-                 'best_descendent_score', 'stop_count']
-
-    def __init__(self, longform=(), parent=None, shortform=None):
-        self.longform = longform
-        if longform:
-            self.count = 1
-            self.sum_ft = self.sum_ft2 = 0
-            self.score = 1
+    _int_fields = ['parent', 'token', 'first_child', 'last_child',
+                   'next_sibling']
+    _count_fields = ['count', 'sum_ft', 'sum_ft2']
+    _float_fields = ['score', 'alignment_score', 'best_ancestor_score',
+                     'best_descendent_score']
+    # Fields written by the binary serialization with their byte layout
+    _stored_fields = [('parent', '<i4'), ('token', '<i4'), ('count', '<i8'),
+                      ('sum_ft', '<i8'), ('sum_ft2', '<i8')]
+
+    def __init__(self):
+        self.tokens = []
+        self.token_ids = {}
+        self.edges = {}
+        for field in self._int_fields:
+            setattr(self, field, array('i', [-1]))
+        for field in self._count_fields:
+            setattr(self, field, array('q', [0]))
+        self.score = array('d', [-1.0])
+        self.alignment_score = array('d', [0.0])
+        self.best_ancestor_score = array('d', [-1.0])
+        self.best_descendent_score = array('d', [-1.0])
+        self.aligned = array('b', [1])
+        self.num_propagated = 1
+        self.dirty = set()
+
+    def __len__(self):
+        return len(self.parent)
+
+    def intern(self, token):
+        """Return id of a stemmed token, assigning a new id if necessary"""
+        token_id = self.token_ids.get(token)
+        if token_id is None:
+            token_id = self.token_ids[token] = len(self.tokens)
+            self.tokens.append(token)
+        return token_id
+
+    def child(self, node, token_id):
+        """Return index of child of node for a token id or -1 if absent"""
+        return self.edges.get((node << 32) | token_id, -1)
+
+    def children(self, node):
+        """Return list of indices of the children of a node"""
+        result = []
+        child = self.first_child[node]
+        next_sibling = self.next_sibling
+        while child >= 0:
+            result.append(child)
+            child = next_sibling[child]
+        return result
+
+    def add_child(self, node, token_id, count=1, sum_ft=0, sum_ft2=0):
+        """Add a child for a newly observed candidate and return its index"""
+        new = len(self.parent)
+        self.parent.append(node)
+        self.token.append(token_id)
+        self.first_child.append(-1)
+        self.last_child.append(-1)
+        self.next_sibling.append(-1)
+        self.count.append(count)
+        self.sum_ft.append(sum_ft)
+        self.sum_ft2.append(sum_ft2)
+        self.score.append(count - sum_ft2/sum_ft if sum_ft else count)
+        self.alignment_score.append(0.0)
+        self.best_ancestor_score.append(-1.0)
+        self.best_descendent_score.append(-1.0)
+        self.aligned.append(0)
+        last = self.last_child[node]
+        if last < 0:
+            self.first_child[node] = new
         else:
-            self.score = -1
-        self.parent = parent
-        self.children = {}
-        self.encoded_tokens = []
-        self.word_prizes = []
-        self.sum_parent_word_scores = 0
-        self.best_ancestor_align_score = -1
-        self.alignment_score = 0
-        self.stop_count = 0
-        self.best_ancestor_score = -1
-        self.best_descendent_score = -1
-        if shortform is not None:
-            self.best_char_scores = [-1e20]*len(shortform)
-
-    def is_root(self):
-        """True if node is at the root of the trie"""
-        return self.parent is None
-
-    def increment_count(self, increment=1):
-        """Update count and likelihood when observing a longform again
-
-        Update when a previously observed longform is seen again
-        """
-        self.count += increment
-        self.score += increment
-
-    def update_likelihood(self, count, increment=1):
+            self.next_sibling[last] = new
+        self.last_child[node] = new
+        self.edges[(node << 32) | token_id] = new
+        return new
+
+    def increment_count(self, node, increment=1):
+        """Update count and likelihood when observing a longform again"""
+        self.count[node] += increment
+        self._set_score(node)
+
+    def update_likelihood(self, node, count, increment=1):
         """Update likelihood when observing a child of associated longform
 
         Update when observing a candidate longform which can be obtained
         by prepending one token to the associated longform. This must
-        always be ran after incrementing the count
+        always be ran after incrementing the count of the child.
 
         Parameters
         ----------
+        node : int
+            Index of node
         count : int
             Current co-occurence frequency of child longform with shortform
+        increment : Optional[int]
+            Amount by which the child's count was incremented. Default: 1
         """
-        self.score += self.sum_ft2/self.sum_ft if self.sum_ft else 0
-        self.sum_ft += increment
-        # When this is ran, count will already have been incremented.
-        self.sum_ft2 += 2*count*increment - increment**2
-        self.score -= self.sum_ft2/self.sum_ft
+        self.sum_ft[node] += increment
+        self.sum_ft2[node] += 2*count*increment - increment**2
+        self._set_score(node)
 
-    def to_dict(self):
-        """Returns a dictionary representation of trie
+    def _set_score(self, node):
+        """Recompute likelihood score from counts
+
+        The score is a function of the integer counts alone, so it does not
+        depend on the order in which candidates were observed or tries were
+        merged.
+        """
+        sum_ft = self.sum_ft[node]
+        self.score[node] = self.count[node] - \
+            (self.sum_ft2[node]/sum_ft if sum_ft else 0)
+        if node < self.num_propagated:
+            self.dirty.add(node)
+
+    def longform(self, node):
+        """Return tuple of stemmed tokens of a candidate in reverse order"""
+        tokens = []
+        while node > 0:
+            tokens.append(self.tokens[self.token[node]])
+            node = self.parent[node]
+        return tuple(tokens[::-1])
+
+    def remove_children(self, node):
+        """Detach all descendents of a node
+
+        Detached nodes remain in the arrays until compact is called.
         """
-        if not self.children:
-            return {}
+        stack = [node]
+        while stack:
+            current = stack.pop()
+            for child in self.children(current):
+                del self.edges[(current << 32) | self.token[child]]
+                stack.append(child)
+            self.first_child[current] = self.last_child[current] = -1
+
+    def compact(self):
+        """Rebuild arrays keeping only nodes reachable from the root
+
+        Returns
+        -------
+        list of int
+            Index in the old arrays of each node in the rebuilt trie
+        """
+        order = [0]
+        for node in order:
+            order.extend(self.children(node))
+        self._rebuild(order)
+        return order
+
+    def prune_counts(self, threshold):
+        """Remove all candidates observed at most threshold times
+
+        The count of a node is never less than the counts of its children,
+        so the removed nodes form whole subtrees. The counts of the
+        remaining nodes, including the sums over children used for their
+        likelihood scores, are left unchanged.
+
+        Parameters
+        ----------
+        threshold : int
+            Nodes other than the root with count less than or equal to
+            threshold are removed.
+
+        Returns
+        -------
+        int
+            Number of nodes removed
+        """
+        parents = np.frombuffer(self.parent, dtype=np.int32)[1:]
+        keep = np.frombuffer(self.count, dtype=np.int64) > threshold
+        keep[0] = True
+        # Make sure no node is kept below a removed node even if counts
+        # were loaded from elsewhere. Converges after at most depth steps.
+        while True:
+            orphaned = keep[1:] & ~keep[parents]
+            if not orphaned.any():
+                break
+            keep[1:] &= ~orphaned
+        order = np.flatnonzero(keep)
+        self._rebuild(order)
+        return len(keep) - len(order)
+
+    def _rebuild(self, order):
+        """Keep only the given nodes, renumbered in the given order
+
+        Parents must precede their children in order. Token ids are
+        renumbered so that only tokens still in use are kept.
+        """
+        order = np.asarray(order, dtype=np.int64)
+        new_index = np.full(len(self), -1, dtype=np.int32)
+        new_index[order] = np.arange(len(order), dtype=np.int32)
+        parent = np.frombuffer(self.parent, dtype=np.int32)[order]
+        parent = np.where(parent >= 0, new_index[parent], -1)
+        token = np.frombuffer(self.token, dtype=np.int32)[order]
+        used, token[1:] = np.unique(token[1:], return_inverse=True)
+        self.tokens = [self.tokens[token_id] for token_id in used.tolist()]
+        self.token_ids = {token: index
+                          for index, token in enumerate(self.tokens)}
+        self.parent = array('i', parent.astype(np.int32).tobytes())
+        self.token = array('i', token.tobytes())
+        for field in self._count_fields:
+            values = np.frombuffer(getattr(self, field), dtype=np.int64)
+            setattr(self, field, array('q', values[order].tobytes()))
+        for field in self._float_fields:
+            values = np.frombuffer(getattr(self, field), dtype=np.float64)
+            setattr(self, field, array('d', values[order].tobytes()))
+        self._link()
+        self.reset_alignment()
+        self.num_propagated = 1
+        self.dirty = set()
+
+    def view(self, field):
+        """Return numpy array viewing the array of a field without copying
+
+        Arrays cannot be resized while a view of them exists, so views must
+        be released before nodes are added to the trie.
+        """
+        values = getattr(self, field)
+        dtype = {'i': np.int32, 'q': np.int64, 'd': np.float64,
+                 'b': np.int8}[values.typecode]
+        return np.frombuffer(values, dtype=dtype)
+
+    def depths(self):
+        """Return array with the number of tokens in each candidate
+
+        Computed by pointer jumping, in a number of steps logarithmic in
+        the depth of the trie.
+        """
+        ancestor = self.view('parent').astype(np.int64)
+        ancestor[0] = 0
+        depth = np.ones(len(self), dtype=np.int64)
+        depth[0] = 0
+        # Each step doubles the distance to the ancestor a node points to,
+        # until all nodes point to the root, whose distance to itself is 0
+        while ancestor.any():
+            depth += depth[ancestor]
+            ancestor = ancestor[ancestor]
+        return depth
+
+    def nbytes(self):
+        """Return approximate number of bytes of memory used by the trie
+
+        Includes the node arrays, the edge dictionary and the interned
+        tokens. Integer keys of the edge dictionary are counted as 64 bytes
+        per entry together with their values.
+        """
+        num_nodes = len(self)
+        total = num_nodes*sum(getattr(self, field).itemsize
+                              for field in self._int_fields +
+                              self._count_fields + self._float_fields +
+                              ['aligned'])
+        total += sys.getsizeof(self.edges) + 64*len(self.edges)
+        total += sys.getsizeof(self.tokens) + sys.getsizeof(self.token_ids)
+        total += sum(sys.getsizeof(token) + 28 for token in self.tokens)
+        return total
+
+    def reset_alignment(self):
+        """Mark alignment scores of all nodes other than the root stale"""
+        self.aligned = array('b', [0])*len(self)
+        self.aligned[0] = 1
+
+    def _link(self):
+        """Rebuild child links and edges from parent and token arrays
+
+        Children are linked in order of increasing index.
+        """
+        num_nodes = len(self.parent)
+        for field in ['first_child', 'last_child', 'next_sibling']:
+            setattr(self, field, array('i', [-1])*num_nodes)
+        first_child, last_child = self.first_child, self.last_child
+        next_sibling, parents = self.next_sibling, self.parent
+        for node in range(1, num_nodes):
+            parent = parents[node]
+            last = last_child[parent]
+            if last < 0:
+                first_child[parent] = node
+            else:
+                next_sibling[last] = node
+            last_child[parent] = node
+        parents = np.frombuffer(self.parent, dtype=np.int32)[1:]
+        tokens = np.frombuffer(self.token, dtype=np.int32)[1:]
+        keys = (parents.astype(np.int64) << 32) | tokens
+        self.edges = dict(zip(keys.tolist(), range(1, num_nodes)))
+
+    def write(self, f):
+        """Write binary representation of trie to a binary file object
+
+        Only the tokens and the parent, token and count arrays of each node
+        are written. Arrays are written in little endian byte order.
+        """
+        header = json.dumps({'tokens': self.tokens,
+                             'num_nodes': len(self)}).encode('utf-8')
+        f.write(struct.pack('<Q', len(header)))
+        f.write(header)
+        for field, dtype in self._stored_fields:
+            values = np.frombuffer(getattr(self, field), dtype=dtype[1:])
+            f.write(values.astype(dtype).tobytes())
+
+    @classmethod
+    def read(cls, f):
+        """Read trie from binary representation written by write"""
+        header_length, = struct.unpack('<Q', _read_exactly(f, 8))
+        header = json.loads(_read_exactly(f, header_length).decode('utf-8'))
+        trie = cls()
+        trie.tokens = header['tokens']
+        trie.token_ids = {token: index
+                          for index, token in enumerate(trie.tokens)}
+        num_nodes = header['num_nodes']
+        values = {}
+        for field, dtype in cls._stored_fields:
+            dtype = np.dtype(dtype)
+            data = _read_exactly(f, num_nodes*dtype.itemsize)
+            values[field] = np.frombuffer(data, dtype=dtype)
+            typecode = 'i' if dtype.itemsize == 4 else 'q'
+            setattr(trie, field,
+                    array(typecode,
+                          values[field].astype(dtype.newbyteorder('='))
+                          .tobytes()))
+        # Scores are computed from counts as in _set_score
+        count, sum_ft = values['count'], values['sum_ft']
+        ratio = np.divide(values['sum_ft2'], sum_ft,
+                          out=np.zeros(num_nodes), where=sum_ft != 0)
+        score = count - ratio
+        score[0] = -1
+        trie.score = array('d', score.tobytes())
+        trie.alignment_score = array('d', [0.0])*num_nodes
+        trie.best_ancestor_score = array('d', [-1.0])*num_nodes
+        trie.best_descendent_score = array('d', [-1.0])*num_nodes
+        trie.reset_alignment()
+        trie._link()
+        return trie
+
+    def to_dict(self):
+        """Returns a dictionary representation of trie"""
         out = {}
-        for token, child in self.children.items():
-            out[token] = {'count': child.count, 'score': child.score,
-                          'sum_ft': child.sum_ft, 'sum_ft2': child.sum_ft2,
-                          'longform': child.longform,
-                          'children': child.to_dict()}
+        stack = [(0, out)]
+        while stack:
+            node, entries = stack.pop()
+            for child in self.children(node):
+                children = {}
+                entries[self.tokens[self.token[child]]] = \
+                    {'count': self.count[child],
+                     'score': self.score[child],
+                     'sum_ft': self.sum_ft[child],
+                     'sum_ft2': self.sum_ft2[child],
+                     'longform': self.longform(child),
+                     'children': children}
+                stack.append((child, children))
         return out
 
 
-def load_trie(trie_dict, shortform):
+def load_trie(trie_dict, shortform=None):
     """Load a Trie from dictionary representation
 
     Parameters
     ---------
     trie_dict : dict
         Dictionary representation of trie as returned by to_dict method of
-        py:class`adeft.discover._TrieNode`
+        py:class`adeft.discover._CompactTrie`
+
+    shortform : Optional[str]
+        Unused. Kept for backwards compatibility.
 
     Returns
     -------
-    py:class:`adeft.discover._TrieNode`
-        root of trie built from input dictionary
+    py:class:`adeft.discover._CompactTrie`
+        trie built from input dictionary
     """
-    root = _TrieNode(shortform=shortform)
-    for key, value in trie_dict.items():
-        root.children[key] = _load_trie_helper(value, root)
-    return root
-
-
-def _load_trie_helper(entry, parent):
-    node = _TrieNode(longform=tuple(entry['longform']), parent=parent)
-    node.count = entry['count']
-    node.score = entry['score']
-    node.sum_ft = entry['sum_ft']
-    node.sum_ft2 = entry['sum_ft2']
-    for key, value in entry['children'].items():
-        node.children[key] = _load_trie_helper(value, parent=node)
-    return node
+    trie = _CompactTrie()
+    stack = [(0, trie_dict)]
+    while stack:
+        node, entries = stack.pop()
+        for token, entry in entries.items():
+            child = trie.add_child(node, trie.intern(token),
+                                   count=entry['count'],
+                                   sum_ft=entry['sum_ft'],
+                                   sum_ft2=entry['sum_ft2'])
+            trie.score[child] = entry['score']
+            stack.append((child, entry['children']))
+    return trie
 
 
 class AdeftMiner(object):
@@ -239,9 +531,29 @@ class AdeftMiner(object):
         longforms would be taken from the string
         "ters before a defining pattern". Default: 100
 
+    max_nodes : Optional[int]
+        Budget for the number of nodes in the candidate trie. Whenever
+        process_texts or update leaves the trie larger than this, the least
+        frequent candidates are removed with :py:meth:`prune_rare` until
+        the trie is at most three quarters of the budget. If None, the
+        number of nodes is not bounded. Default: None
+
+    max_memory : Optional[int]
+        Budget in bytes for the memory used by the candidate trie, as
+        estimated by :py:meth:`adeft.discover._CompactTrie.nbytes`. Enforced
+        in the same way as max_nodes. If None, memory is not bounded.
+        Default: None
+
     Attributes
     ----------
-    _internal_trie : :py:class:`adeft.discover._TrieNode`
+    count_error_bound : int
+        Sum of the thresholds of all pruning steps. Counts of candidates in
+        the trie are never overestimated, and are underestimated by at most
+        this amount. Candidates that have never been removed have exact
+        counts and their likelihood scores exceed the exact scores by at
+        most twice this amount. 0 if the miner has never been pruned.
+
+    _internal_trie : :py:class:`adeft.discover._CompactTrie`
         Stores trie data-structure used to implement the algorithm
 
     _stemmer : :py:class:`adeft.nlp.stem.SnowCounter`
@@ -249,26 +561,24 @@ class AdeftMiner(object):
         given word has been mapped to a given stem. Wraps the class
         EnglishStemmer from nltk.stem.snowball
 
-    _alignment_scores_computed : bool
-        Will be True if alignment scores have been computed for the current
-        state of the candidate trie. It is reset to False any time the
-        process_texts method is run
-
-    _scores_propagated : bool
-        Will be True if best ancestor and best descendent likelihood scores
-        have been propagated to each node for the current state of the
-        candidate trie. It is reset to False any time the process_texts method
-        is run.
+    _alignment_params : dict or None
+        Parameters of the alignment based scorer used for the alignment
+        scores currently stored in the trie. None if alignment scores have
+        never been computed. New candidates are scored with the same
+        parameters.
     """
-    def __init__(self, shortform, window=100):
+    def __init__(self, shortform, window=100, max_nodes=None,
+                 max_memory=None):
         self.shortform = shortform
-        self._internal_trie = _TrieNode(shortform=shortform)
+        self._internal_trie = _CompactTrie()
         self._stemmer = WatchfulStemmer()
         self.window = window
-        self._alignment_scores_computed = False
-        self._scores_propagated = False
+        self.max_nodes = max_nodes
+        self.max_memory = max_memory
+        self.count_error_bound = 0
+        self._alignment_params = None
 
-    def process_texts(self, texts):
+    def process_texts(self, texts, n_jobs=1, batch_size=1000):
         """Update longform candidate scores from a corpus of texts
 
         Runs co-occurence statistics in a corpus of texts to compute
@@ -281,8 +591,37 @@ class AdeftMiner(object):
         ----------
         texts : list of str
             A list of texts
+        n_jobs : Optional[int]
+            Number of processes to use. If greater than one, the texts are
+            split into consecutive shards which are processed by separate
+            miners in worker processes. The resulting miners are then merged
+            in order, giving the same result as processing the texts serially
+            unless the miner has a node or memory budget, in which case each
+            worker enforces the budget on its own shard. Default: 1
+        batch_size : Optional[int]
+            Number of texts for which candidates are collected before they are
+            added to the trie. Identical candidates within a batch are
+            stemmed and inserted once, with their counts incremented by the
+            number of times they were observed. Default: 1000
         """
-        for text in texts:
+        if n_jobs != 1:
+            texts = list(texts)
+            if n_jobs is None or n_jobs < 0:
+                n_jobs = os.cpu_count() or 1
+            n_jobs = min(n_jobs, len(texts))
+        if n_jobs > 1:
+            shard_size = -(-len(texts) // n_jobs)
+            miners = Parallel(n_jobs=n_jobs)(
+                delayed(_process_shard)(self.shortform, self.window,
+                                        texts[start:start+shard_size],
+                                        batch_size, self.max_nodes,
+                                        self.max_memory)
+                for start in range(0, len(texts), shard_size))
+            for miner in miners:
+                self.update(miner, consume=True)
+            return
+        candidates = Counter()
+        for index, text in enumerate(texts):
             # lonform candidates taken from a window of text before each
             # defining pattern
             fragments = get_candidate_fragments(text, self.shortform,
@@ -290,18 +629,125 @@ class AdeftMiner(object):
             for fragment in fragments:
                 if fragment:
                     candidate, _ = get_candidate(fragment)
-                    self._add(candidate)
-        self._alignment_scores_computed = False
-        self._scores_propagated = False
+                    candidates[tuple(candidate)] += 1
+            if (index + 1) % batch_size == 0:
+                self._add_batch(candidates)
+                self._enforce_budget()
+                candidates = Counter()
+        self._add_batch(candidates)
+        self._enforce_budget()
+
+    def process_stream(self, source, checkpoint_path=None,
+                       checkpoint_interval=100000, batch_size=1000,
+                       text_key='text'):
+        """Update longform candidate scores from a stream of texts
+
+        Texts are read lazily and processed in batches, so the corpus need
+        not fit in memory. The state of the miner can be checkpointed to a
+        file at regular intervals. If the checkpoint file exists when this
+        method is called, the miner's state is replaced by the checkpointed
+        state and processing resumes with the first text that had not been
+        processed, allowing interrupted jobs to be continued.
+
+        Parameters
+        ----------
+        source : str or iterable of str
+            Either an iterable of texts or a path to a file. Files with the
+            extension .jsonl contain one json value per line, either a string
+            or an object containing the text under text_key. Other files are
+            read as plain text with one text per line. When resuming, texts
+            from a file are read starting at the stored file position and
+            texts from an iterable are skipped until the stored number of
+            texts have been consumed.
+        checkpoint_path : Optional[str]
+            Path of file where the state of the miner is saved in the binary
+            format of the dump method.
+            The file is replaced atomically, so an interruption never leaves
+            a partially written checkpoint. If None, no checkpoints are
+            written. Default: None
+        checkpoint_interval : Optional[int]
+            Number of texts to process between checkpoints. Default: 100000
+        batch_size : Optional[int]
+            Number of texts read into memory and processed at a time. See
+            process_texts. Default: 1000
+        text_key : Optional[str]
+            Key of texts in objects of a jsonl file. Default: 'text'
+
+        Returns
+        -------
+        int
+            Total number of texts processed, including those processed before
+            resuming from a checkpoint.
+        """
+        num_texts, offset = 0, 0
+        if checkpoint_path is not None and os.path.exists(checkpoint_path):
+            with open(checkpoint_path, 'rb') as f:
+                if f.read(len(_binary_magic)) != _binary_magic:
+                    raise ValueError('%s is not an AdeftMiner checkpoint'
+                                     % checkpoint_path)
+                miner, checkpoint = _read_binary(f)
+            if miner.shortform != self.shortform:
+                raise ValueError('Checkpoint is for shortform %s'
+                                 % miner.shortform)
+            self._internal_trie = miner._internal_trie
+            self._stemmer = miner._stemmer
+            self.window = miner.window
+            self.count_error_bound = miner.count_error_bound
+            num_texts, offset = checkpoint['num_texts'], checkpoint['offset']
+            logger.info('Resuming from checkpoint after %s texts' % num_texts)
+        if isinstance(source, str) and offset is not None:
+            texts = _read_texts(source, offset, text_key)
+        elif isinstance(source, str):
+            # Checkpoint was written while reading from an iterable
+            texts = islice(_read_texts(source, 0, text_key), num_texts, None)
+        else:
+            texts = ((text, None) for text in islice(source, num_texts, None))
+        last_checkpoint = num_texts
+        batch = []
+        for text, offset in texts:
+            batch.append(text)
+            if len(batch) < batch_size:
+                continue
+            self.process_texts(batch, batch_size=batch_size)
+            num_texts += len(batch)
+            batch = []
+            if checkpoint_path is not None and \
+               num_texts - last_checkpoint >= checkpoint_interval:
+                self._checkpoint(checkpoint_path, num_texts, offset)
+                last_checkpoint = num_texts
+        self.process_texts(batch, batch_size=batch_size)
+        num_texts += len(batch)
+        if checkpoint_path is not None and num_texts > last_checkpoint:
+            self._checkpoint(checkpoint_path, num_texts, offset)
+        return num_texts
+
+    def _checkpoint(self, checkpoint_path, num_texts, offset):
+        """Atomically save state of miner and position in stream"""
+        temp_path = '%s.%s.tmp' % (checkpoint_path, uuid.uuid4().hex)
+        with open(temp_path, 'wb') as f:
+            self._write_binary(f, {'num_texts': num_texts, 'offset': offset})
+        os.replace(temp_path, checkpoint_path)
+        logger.info('Checkpointed miner after %s texts' % num_texts)
+
+    def _load_state(self, dictionary):
+        """Replace trie and stemmer with those of a dictionary serialization
+        """
+        self._internal_trie = load_trie(dictionary['internal_trie'])
+        self._stemmer = WatchfulStemmer(dictionary['stemmer'])
+        self.window = dictionary['window']
+        self.count_error_bound = dictionary.get('count_error_bound', 0)
 
     def top(self, limit=None, smoothing_param=4, max_length='auto',
-            use_alignment_based_scoring=True, weight_decay_param=0.001):
+            use_alignment_based_scoring=True, weight_decay_param=0.001,
+            n_jobs=1):
         """Return top scoring candidates.
 
         Parameters
         ----------
         limit : Optional[int]
-            Limit for the number of candidates to return. Default: None
+            Limit for the number of candidates to return. If given, subtrees
+            of the candidate trie that cannot contain a top candidate are not
+            visited. Default: None
 
         smoothing_param : Optional[float]
             Smoothing parameter for the scaled likelihood score.  Likelihood
@@ -337,6 +783,11 @@ class AdeftMiner(object):
             longforms can be arbitrarily long. If 'auto', max_length is set
             to 2*len(self.shortform)+1
 
+        n_jobs : Optional[int]
+            Number of processes used to compute alignment scores for
+            candidates that have not been scored yet. See
+            compute_alignment_scores. Default: 1
+
         Returns
         ------
         candidates : list of tuple
@@ -348,29 +799,71 @@ class AdeftMiner(object):
         """
         if max_length == 'auto':
             max_length = 2*len(self.shortform) + 1
-        score_func = self._get_score_function(smoothing_param,
-                                              use_alignment_based_scoring,
-                                              weight_decay_param)
-        root = self._internal_trie
-        stack = [(root, 0)]
+        scores, pending, resolve = \
+            self._get_scores(smoothing_param, use_alignment_based_scoring,
+                             weight_decay_param, n_jobs=n_jobs)
+        trie = self._internal_trie
+        depth = trie.depths()
+        candidates = depth > 0
+        if max_length is not None:
+            candidates &= depth <= max_length
+        nodes = np.flatnonzero(candidates)
+        if limit is not None and limit >= 0:
+            nodes = self._top_nodes(nodes, limit, scores, pending, resolve,
+                                    depth)
+        else:
+            resolve(nodes[pending[nodes]])
+        # Readable longforms are only needed for candidates that may be
+        # returned, where they break ties.
         result = []
-        while stack:
-            current, depth = stack.pop()
-            if max_length is not None and depth + 1 > max_length:
-                continue
-            for child in current.children.values():
-                score, count = score_func(child)
-                result.append([child.longform,
-                               self._make_readable(child.longform),
-                               count, score])
-                stack.append((child, depth+1))
+        for node, count, score in zip(nodes.tolist(),
+                                      trie.view('count')[nodes].tolist(),
+                                      scores[nodes].tolist()):
+            longform = trie.longform(node)
+            result.append([longform, self._make_readable(longform),
+                           count, score])
         result.sort(key=lambda x: (-x[3], -x[2], len(x[0]), x[1]))
         return [(longform, score, count)
                 for _, longform, score, count in result[:limit]]
 
+    def _top_nodes(self, nodes, limit, scores, pending, resolve, depth):
+        """Return nodes that may be among the top candidates
+
+        Candidates are ranked by score, count and length. Alignment scores
+        are computed for pending nodes whose score bounds reach the limit-th
+        best entry of scores, until the best limit entries are all exact.
+        All candidates ranked at least as highly as the limit-th best
+        candidate are returned. Ties between them must be broken by the
+        caller.
+        """
+        if limit == 0:
+            return nodes[:0]
+        if limit >= len(nodes):
+            resolve(nodes[pending[nodes]])
+            return nodes
+        position = len(nodes) - limit
+        while True:
+            node_scores = scores[nodes]
+            kth = np.partition(node_scores, position)[position]
+            # Allow for rounding differences between scores and bounds
+            unresolved = nodes[pending[nodes] & (node_scores + 1e-9 >= kth)]
+            if not len(unresolved):
+                break
+            resolve(unresolved)
+        nodes = nodes[node_scores >= kth]
+        counts = self._internal_trie.view('count')[nodes]
+        node_scores, node_depth = scores[nodes], depth[nodes]
+        worst = np.lexsort((node_depth, -counts, -node_scores))[limit - 1]
+        worst_score, worst_count = node_scores[worst], counts[worst]
+        keep = (node_scores > worst_score) | \
+            (node_scores == worst_score) & \
+            ((counts > worst_count) |
+             (counts == worst_count) & (node_depth <= node_depth[worst]))
+        return nodes[keep]
+
     def get_longforms(self, cutoff=0.1, smoothing_param=4,
                       max_length='auto', use_alignment_based_scoring=True,
-                      weight_decay_param=0.001):
+                      weight_decay_param=0.001, n_jobs=1):
         """Return a list of extracted longforms with their scores
 
         Traverse the candidates trie to search for nodes with score
@@ -417,6 +910,11 @@ class AdeftMiner(object):
             longforms can be arbitrarily long. If 'auto', max_length is set
             to 2*len(self.shortform)+1
 
+        n_jobs : Optional[int]
+            Number of processes used to compute alignment scores for
+            candidates that have not been scored yet. See
+            compute_alignment_scores. Default: 1
+
         Returns
         -------
         longforms : list of tuple
@@ -427,29 +925,25 @@ class AdeftMiner(object):
         if max_length == 'auto':
             max_length = 2*len(self.shortform)+1
 
-        def _get_longform_helper(node, score_func, depth):
-            if not node.children or (max_length is not None and
-                                     depth == max_length):
-                score, count = score_func(node)
-                return [(node.longform, score, count)]
-            result = []
-            for child in node.children.values():
-                child_longforms = _get_longform_helper(child, score_func,
-                                                       depth + 1)
-                result.extend([(longform, score, count)
-                               for longform, score, count in
-                               child_longforms if node.is_root() or
-                               score > score_func(node)[0]])
-            if not result:
-                score, count = score_func(node)
-                result = [(node.longform, score, count)]
-            return result
-
-        score_func = self._get_score_function(smoothing_param,
-                                              use_alignment_based_scoring,
-                                              weight_decay_param)
-        root = self._internal_trie
-        longforms = _get_longform_helper(root, score_func, 0)
+        trie = self._internal_trie
+        scores, pending, resolve = \
+            self._get_scores(smoothing_param, use_alignment_based_scoring,
+                             weight_decay_param, n_jobs=n_jobs)
+        depth = trie.depths()
+        candidates = depth > 0
+        if max_length is not None:
+            candidates &= depth <= max_length
+        # Nodes that cannot score above cutoff are not aligned. Allow for
+        # rounding differences between scores and bounds.
+        below_cutoff = pending & (scores + 1e-9 <= cutoff)
+        resolve(np.flatnonzero(candidates & pending & ~below_cutoff))
+        scores[below_cutoff] = float('-inf')
+        bounds = self._get_bounds(smoothing_param,
+                                  use_alignment_based_scoring,
+                                  weight_decay_param)
+        longforms = self._longform_nodes(scores, max_length, cutoff, bounds)
+        longforms = [(trie.longform(node), score, count)
+                     for node, score, count in longforms]
         # Convert longforms as tuples in reverse order into reader strings
         # mapping stems back to the most frequent token that had been mapped
         longforms = [(longform, score, count)
@@ -470,66 +964,336 @@ class AdeftMiner(object):
         return [(longform, count, score)
                 for longform, score, count in longforms]
 
-    def _propagate_scores(self):
-        """Add best descendent and best ancestor likelihood scores for nodes
+    def _longform_nodes(self, scores, max_length, cutoff=None, bounds=None):
+        """Return nodes of longforms found by get_longforms with their scores
+
+        Leaves and nodes at max_length are longforms. Any other node passes up
+        the longforms found below it that score strictly higher than it does,
+        or is itself a longform if there are none. The trie is traversed in
+        post order with an explicit stack.
+
+        If a cutoff and an array of bounds on the scores in the subtree of
+        each node are given, subtrees whose bound is at most cutoff are
+        skipped. This does not change the longforms scoring above cutoff.
+        Longforms scoring at most cutoff can only displace other such
+        longforms, since any node scoring above cutoff filters them out.
+
+        Returns
+        -------
+        list of tuple
+            Triples (node, score, count) in depth first order.
         """
-        root = self._internal_trie
-        stack = [root]
+        trie = self._internal_trie
+        scores = scores.tolist()
+        counts = trie.view('count').tolist()
+        if bounds is not None and cutoff is not None:
+            bounds = bounds.tolist()
+        else:
+            bounds = None
+        # Longforms found in the subtree of each node whose children have
+        # been processed but whose parent has not
+        found = {}
+        stack = [(0, 0, None)]
         while stack:
-            current = stack.pop()
-            for _, child in current.children.items():
-                if child.score > current.best_ancestor_score:
-                    child.best_ancestor_score = child.score
+            node, depth, children = stack.pop()
+            if children is None:
+                children = trie.children(node)
+                if not children or (max_length is not None and
+                                    depth == max_length):
+                    found[node] = [(node, scores[node], counts[node])]
                 else:
-                    child.best_ancestor_score = current.best_ancestor_score
-                stack.append(child)
-            if not current.children:
-                current.best_descendent_score = current.score
-                while (current.parent is not None and
-                       (current.best_descendent_score > current.parent.score
-                        or not current.parent.best_descendent_score)):
-                    parent = current.parent
-                    if parent.score > current.best_descendent_score:
-                        parent.best_descendent_score = parent.score
-                    else:
-                        parent.best_descendent_score = \
-                            current.best_descendent_score
-                    current = parent
-
-    def compute_alignment_scores(self, **params):
+                    if bounds is not None:
+                        children = [child for child in children
+                                    if bounds[child] + 1e-9 > cutoff]
+                    # Revisit the node once all of its children are done
+                    stack.append((node, depth, children))
+                    stack.extend((child, depth + 1, None)
+                                 for child in reversed(children))
+                continue
+            # The root never filters the longforms found below it
+            score = scores[node]
+            result = [longform for child in children
+                      for longform in found.pop(child)
+                      if node == 0 or longform[1] > score]
+            if not result:
+                result = [(node, score, counts[node])]
+            found[node] = result
+        return found[0]
+
+    def node_statistics(self):
+        """Return statistics of all candidates in the trie as numpy arrays
+
+        Best ancestor and descendent likelihood scores are propagated first.
+        Node 0 is the root of the trie and is associated to the empty
+        candidate.
+
+        Returns
+        -------
+        dict
+            Maps 'count', 'score', 'best_ancestor_score',
+            'best_descendent_score' and 'alignment_score' to the arrays of
+            the corresponding fields of
+            :py:class:`adeft.discover._CompactTrie`, 'aligned' to a boolean
+            array marking nodes whose alignment scores are up to date, and
+            'depth' to the number of tokens in each candidate. The arrays are
+            copies and remain valid as the miner is updated.
+        """
+        self._propagate_scores()
+        trie = self._internal_trie
+        statistics = {field: trie.view(field).copy()
+                      for field in ['count', 'score', 'best_ancestor_score',
+                                    'best_descendent_score',
+                                    'alignment_score']}
+        statistics['aligned'] = trie.view('aligned') == 1
+        statistics['depth'] = trie.depths()
+        return statistics
+
+    def _propagate_scores(self):
+        """Add best descendent and best ancestor likelihood scores for nodes
+
+        Only nodes added or with changed likelihood scores since the last
+        propagation, together with their ancestors and the descendents whose
+        best ancestor score changes as a result, are updated. Everything is
+        recomputed if a large part of the trie has changed.
+        """
+        trie = self._internal_trie
+        changed = trie.dirty.union(range(trie.num_propagated, len(trie)))
+        if not changed:
+            return
+        if len(changed) > len(trie) // 4:
+            self._propagate_all_scores()
+        else:
+            self._propagate_changed_scores(changed)
+        trie.num_propagated = len(trie)
+        trie.dirty = set()
+
+    def _propagate_all_scores(self):
+        trie = self._internal_trie
+        parent, score = trie.view('parent'), trie.view('score')
+        best_ancestor = trie.view('best_ancestor_score')
+        best_descendent = trie.view('best_descendent_score')
+        best_ancestor[0] = best_descendent[0] = -1
+        best_descendent[1:] = score[1:]
+        # Nodes are grouped by depth. Best ancestor scores are propagated one
+        # level at a time from the top down and best descendent scores from
+        # the bottom up.
+        depth = trie.depths()
+        order = np.argsort(depth, kind='stable')
+        ends = np.searchsorted(depth[order], np.arange(1, depth.max() + 2))
+        levels = [order[start:end] for start, end in zip(ends[:-1], ends[1:])]
+        for nodes in levels:
+            best_ancestor[nodes] = np.maximum(score[nodes],
+                                              best_ancestor[parent[nodes]])
+        for nodes in reversed(levels):
+            np.maximum.at(best_descendent, parent[nodes],
+                          best_descendent[nodes])
+
+    def _propagate_changed_scores(self, changed):
+        trie = self._internal_trie
+        parent, score = trie.parent, trie.score
+        best_ancestor = trie.best_ancestor_score
+        best_descendent = trie.best_descendent_score
+        # Best ancestor scores are updated from the top down. Nodes are
+        # processed in order of increasing index, so a node's parent is
+        # always final when it is reached. Descendents only need to be
+        # visited if a node's best ancestor score changed.
+        heap = list(changed)
+        heapq.heapify(heap)
+        seen = set(heap)
+        while heap:
+            node = heapq.heappop(heap)
+            value = max(score[node], best_ancestor[parent[node]])
+            if value == best_ancestor[node]:
+                continue
+            best_ancestor[node] = value
+            for child in trie.children(node):
+                if child not in seen:
+                    seen.add(child)
+                    heapq.heappush(heap, child)
+        # Best descendent scores are updated from the bottom up in order of
+        # decreasing index, moving to a parent only if a value changed.
+        heap = [-node for node in changed]
+        heapq.heapify(heap)
+        seen = set(changed)
+        while heap:
+            node = -heapq.heappop(heap)
+            value = max([score[node]] + [best_descendent[child] for child
+                                         in trie.children(node)])
+            if value == best_descendent[node]:
+                continue
+            best_descendent[node] = value
+            node = parent[node]
+            if node >= 0 and node not in seen:
+                seen.add(node)
+                heapq.heappush(heap, -node)
+
+    def compute_alignment_scores(self, n_jobs=1, **params):
         """Compute and add alignment scores to candidate nodes in trie
 
+        Alignment scores depend only on a candidate's tokens. If they were
+        previously computed with the same parameters, only candidates added
+        since then are scored.
+
         Parameters
         ----------
+        n_jobs : Optional[int]
+            Number of processes to use. If greater than one, the subtrees
+            below the children of the root, or below the nodes where unscored
+            candidates start, are divided between worker processes. Only the
+            tokens of each subtree are sent to the workers and only the
+            alignment scores are sent back. Default: 1
         **params
             Parameters for py:class`AlignmentBasedScorer`
         """
         abs_ = AlignmentBasedScorer(self.shortform, **params)
-        root = self._internal_trie
-        stack = [root]
+        trie = self._internal_trie
+        if params != self._alignment_params:
+            trie.reset_alignment()
+        self._alignment_params = params
+        # The intermediate state of the alignment based scorer for a node,
+        # consisting of its alignment score, encoded tokens, word prizes,
+        # best ancestor alignment score, best char scores, sum of parent word
+        # scores and count of leading stopwords, is only needed while
+        # scoring its children and is kept on the stack rather than stored.
+        stack = self._unaligned_subtrees(abs_)
+        aligned = trie.aligned
+        if n_jobs is None or n_jobs < 0:
+            n_jobs = os.cpu_count() or 1
+        if n_jobs > 1:
+            self._parallel_alignment_scores(stack, n_jobs, params)
+            stack = []
         # Perform depth first search calculating scores for each candidate in
         # trie. Alignment score of best ancestor is used to decide how current
         # node is processed (No computation is performed if score cannot be
         # improved. No computation for permutations with inversion count that
         # makes improving on best score impossible.
         while stack:
-            current = stack.pop()
-            for token, child in current.children.items():
-                data = [current.alignment_score, current.encoded_tokens,
-                        current.word_prizes, current.best_ancestor_align_score,
-                        current.best_char_scores,
-                        current.sum_parent_word_scores,
-                        current.stop_count]
+            current, data = stack.pop()
+            for child in trie.children(current):
+                if aligned[child]:
+                    continue
+                token = trie.tokens[trie.token[child]]
                 new_data = abs_._next_score(token, *data)
-                child.alignment_score = new_data[0]
-                child.encoded_tokens = new_data[1]
-                child.word_prizes = new_data[2]
-                child.best_ancestor_align_score = new_data[3]
-                child.best_char_scores = new_data[4]
-                child.sum_parent_word_scores = new_data[5]
-                child.stop_count = new_data[6]
-                stack.append(child)
-        self._abs_fit = True
+                trie.alignment_score[child] = new_data[0]
+                stack.append((child, new_data))
+        trie.aligned = array('b', [1])*len(trie)
+
+    def _parallel_alignment_scores(self, starts, n_jobs, params):
+        """Compute alignment scores of subtrees in worker processes
+
+        Parameters
+        ----------
+        starts : list of tuple
+            Pairs of a node and its alignment based scorer state. The
+            subtrees below its children that are not aligned are scored.
+        n_jobs : int
+            Number of processes to use
+        params : dict
+            Parameters for py:class`AlignmentBasedScorer`
+        """
+        trie = self._internal_trie
+        # Each subtree is sent as its scorer state at the parent of its root
+        # together with token ids and depths of its nodes in preorder
+        subtrees = []
+        for start, data in starts:
+            for root in trie.children(start):
+                if trie.aligned[root]:
+                    continue
+                nodes, depths = array('i'), array('i')
+                stack = [(root, 1)]
+                while stack:
+                    node, depth = stack.pop()
+                    nodes.append(node)
+                    depths.append(depth)
+                    stack.extend((child, depth + 1)
+                                 for child in reversed(trie.children(node)))
+                subtrees.append((nodes, depths, data))
+        if not subtrees:
+            return
+        # Subtrees are split into more chunks than processes and assigned
+        # largest first to balance the load
+        num_chunks = min(len(subtrees), 4*n_jobs)
+        chunks = [[] for _ in range(num_chunks)]
+        loads = [(0, index) for index in range(num_chunks)]
+        for nodes, depths, data in sorted(subtrees,
+                                          key=lambda x: len(x[0]),
+                                          reverse=True):
+            load, index = heapq.heappop(loads)
+            chunks[index].append((nodes, depths, data))
+            heapq.heappush(loads, (load + len(nodes), index))
+        chunks = [chunk for chunk in chunks if chunk]
+        results = Parallel(n_jobs=n_jobs)(
+            delayed(_score_subtrees)(
+                self.shortform, params,
+                [([trie.tokens[trie.token[node]] for node in nodes], depths,
+                  data) for nodes, depths, data in chunk])
+            for chunk in chunks)
+        alignment_score = np.frombuffer(trie.alignment_score)
+        for chunk, chunk_scores in zip(chunks, results):
+            for (nodes, _, _), scores in zip(chunk, chunk_scores):
+                alignment_score[np.frombuffer(nodes, dtype=np.int32)] = \
+                    np.frombuffer(scores)
+
+    def _unaligned_subtrees(self, abs_):
+        """Return scorer states for aligned nodes with unaligned children
+
+        The unaligned children of the returned nodes are the roots of the
+        subtrees of unaligned nodes. Scorer states are rebuilt by replaying
+        the path of tokens from the root of the trie.
+        """
+        trie = self._internal_trie
+        aligned = np.frombuffer(trie.aligned, dtype=np.int8)
+        parents = np.frombuffer(trie.parent, dtype=np.int32)
+        parents = np.unique(parents[aligned == 0])
+        result = []
+        for parent in parents[aligned[parents] == 1].tolist():
+            data = self._root_alignment_state()
+            path = []
+            node = parent
+            while node > 0:
+                path.append(node)
+                node = trie.parent[node]
+            for node in reversed(path):
+                data = abs_._next_score(trie.tokens[trie.token[node]], *data)
+            result.append((parent, data))
+        return result
+
+    def _get_alignment_function(self):
+        """Return function computing alignment scores of nodes on demand
+
+        Scores are stored in the trie. Scorer states needed for the children
+        of nodes that have been scored are memoized for the lifetime of the
+        returned function, so following a path down the trie scores each
+        node once.
+        """
+        if self._alignment_params is None:
+            self._alignment_params = {}
+        abs_ = AlignmentBasedScorer(self.shortform, **self._alignment_params)
+        trie = self._internal_trie
+        aligned, alignment_score = trie.aligned, trie.alignment_score
+        parent, token, tokens = trie.parent, trie.token, trie.tokens
+        states = {0: self._root_alignment_state()}
+
+        def alignment_func(node):
+            if aligned[node]:
+                return alignment_score[node]
+            path = []
+            current = node
+            while current not in states:
+                path.append(current)
+                current = parent[current]
+            data = states[current]
+            for current in reversed(path):
+                data = abs_._next_score(tokens[token[current]], *data)
+                states[current] = data
+                alignment_score[current] = data[0]
+                aligned[current] = 1
+            return alignment_score[node]
+        return alignment_func
+
+    def _root_alignment_state(self):
+        """Return alignment based scorer state for the empty candidate"""
+        return (0, [], [], -1, [-1e20]*len(self.shortform), 0, 0)
 
     def prune(self, max_depth):
         """Prune away all nodes with depth greater than max_depth
@@ -540,19 +1304,91 @@ class AdeftMiner(object):
             Positive integer. Maximum depth for nodes to keep in the candidate
             trie. Corresponds to maximum number of tokens in longforms.
         """
-        root = self._internal_trie
-        stack = [(root, 0)]
+        trie = self._internal_trie
+        stack = [(0, 0)]
         while stack:
             current, depth = stack.pop()
             if depth + 1 > max_depth:
-                for child in current.children.values():
-                    child = None
-                current.children = {}
+                trie.remove_children(current)
                 continue
-            for child in current.children.values():
+            for child in trie.children(current):
                 stack.append((child, depth + 1))
+        trie.compact()
+
+    def prune_rare(self, max_nodes):
+        """Remove the least frequent candidates from the trie
 
-    def _add(self, tokens):
+        All candidates observed at most some threshold number of times are
+        removed, with the threshold chosen as small as possible so that at
+        most max_nodes nodes remain. Candidates with equal counts are
+        removed together, so the result does not depend on the order in
+        which candidates were observed. If a removed candidate is observed
+        again it is counted from zero, so its count is underestimated by at
+        most the threshold. The threshold is added to count_error_bound.
+        Word counts for stems no longer appearing in any candidate are
+        discarded as well.
+
+        Parameters
+        ----------
+        max_nodes : int
+            Positive integer. Maximum number of nodes to keep in the trie,
+            including the root.
+
+        Returns
+        -------
+        int
+            Threshold used. 0 if the trie already had at most max_nodes
+            nodes.
+        """
+        trie = self._internal_trie
+        if len(trie) <= max_nodes:
+            return 0
+        counts = np.sort(np.frombuffer(trie.count, dtype=np.int64)[1:])
+        threshold = int(counts[len(counts) - max(max_nodes, 1)])
+        num_removed = trie.prune_counts(threshold)
+        self.count_error_bound += threshold
+        stems = self._stemmer.counts
+        for stem in [stem for stem in stems if stem not in trie.token_ids]:
+            del stems[stem]
+        logger.info('Removed %s candidates observed at most %s times'
+                    % (num_removed, threshold))
+        return threshold
+
+    def _enforce_budget(self):
+        """Prune rare candidates if the trie exceeds its node or memory budget
+        """
+        trie = self._internal_trie
+        max_nodes = self.max_nodes
+        if self.max_memory is not None:
+            nbytes = trie.nbytes()
+            if nbytes > self.max_memory:
+                memory_nodes = int(len(trie)*self.max_memory/nbytes)
+                max_nodes = memory_nodes if max_nodes is None \
+                    else min(max_nodes, memory_nodes)
+        if max_nodes is not None and len(trie) > max_nodes:
+            # Prune below the budget so that pruning is not repeated after
+            # every batch
+            self.prune_rare(max(1, 3*max_nodes // 4))
+
+    def _add_batch(self, candidates):
+        """Add candidates with counts to the internal trie
+
+        Distinct candidates are stemmed once. Candidates with identical stems
+        are inserted together.
+
+        Parameters
+        ----------
+        candidates : :py:class:`collections.Counter`
+            Maps tuples of tokens to the number of times they were observed
+        """
+        stemmed = Counter()
+        for tokens, count in candidates.items():
+            stemmed[tuple(self._stemmer.stem(token, count)
+                          for token in tokens)[::-1]] += count
+        for tokens, count in stemmed.items():
+            self._insert(tokens, count)
+
+    def _add(self, tokens, count=1):
         """Add a list of tokens to the internal trie and update likelihoods.
 
         Parameters
@@ -560,75 +1396,143 @@ class AdeftMiner(object):
         tokens : str
             A list of tokens to add to the internal trie.
 
+        count : Optional[int]
+            Number of times the list of tokens has been observed. Default: 1
         """
-        # start at top of trie
-        current = self._internal_trie
         # apply snowball stemmer to each token and put them in reverse order
-        tokens = tuple(self._stemmer.stem(token) for token in tokens)[::-1]
+        tokens = tuple(self._stemmer.stem(token, count)
+                       for token in tokens)[::-1]
+        self._insert(tokens, count)
+
+    def _insert(self, tokens, count=1):
+        """Insert stemmed tokens in reverse order into the internal trie
+
+        Inserting a candidate once with a given count updates counts and
+        likelihoods exactly as inserting it count times.
+        """
+        trie = self._internal_trie
+        # start at top of trie
+        current = 0
         for token in tokens:
-            if token not in current.children:
+            token_id = trie.intern(token)
+            child = trie.child(current, token_id)
+            if child < 0:
                 # candidate longform is observed for the first time
                 # add a new entry for it in the trie
-                longform = current.longform + (token, )
-                new = _TrieNode(longform, parent=current)
+                child = trie.add_child(current, token_id, count)
                 # update likelihood of current node to account for the new
                 # child unless current node is the root
-                if not current.is_root():
-                    current.update_likelihood(1)
-                # set newly observed longform to be the child of current node
-                current.children[token] = new
-                # update current node to the newly formed node
-                current = new
+                if current:
+                    trie.update_likelihood(current, count, count)
             else:
                 # candidate longform has been observed before
                 # update count for candidate longform and associated LH value
-                current.children[token].increment_count()
-                # Update entry for candidate longform in the candidates
-                # dictionary
-                if not current.is_root():
+                trie.increment_count(child, count)
+                if current:
                     # we are not at the top of the trie. observed candidate
                     # has a parent
                     # update likelihood of candidate's parent
-                    count = current.children[token].count
-                    current.update_likelihood(count)
-                current = current.children[token]
-
-    def _get_score_function(self, smoothing_param,
-                            use_alignment_based_scoring,
-                            weight_decay_param):
-        """Returns scoring function for determining longforms
-
-        Also computes alignment scores and propagates acromine score
-        information for ancestors and descendents in the tree of candidates
-        if necessary.
-        """
-        if not self._scores_propagated:
-            self._propagate_scores()
-            self._scores_propagated = True
-
-        def scaled_score(node):
-            numerator = node.score-1
-            denominator = max(node.best_ancestor_score,
-                              node.best_descendent_score)
-            denominator += smoothing_param - 1
-            score = 0 if denominator <= 0 else numerator/denominator
-            return score
+                    trie.update_likelihood(current, trie.count[child], count)
+            current = child
+
+    def _get_scores(self, smoothing_param, use_alignment_based_scoring,
+                    weight_decay_param, n_jobs=1):
+        """Return scores of all candidates computed with array operations
+
+        Also propagates acromine score information for ancestors and
+        descendents in the tree of candidates if necessary. Scaled likelihood
+        scores, and their weighted averages with alignment scores, are then
+        computed for all nodes at once from numpy views of the trie's arrays.
+
+        Alignment scores are computed on demand, unless n_jobs is not 1, in
+        which case all missing alignment scores are computed in parallel up
+        front. For nodes whose alignment scores are missing, the array of
+        scores holds an upper bound using the largest possible alignment
+        score. The returned resolve function takes an array of such nodes in
+        increasing order, computes their alignment scores and replaces their
+        bounds by their scores.
+
+        Returns
+        -------
+        scores : py:class:`numpy.ndarray`
+            Score, or upper bound on the score, of each node
+        pending : py:class:`numpy.ndarray`
+            Boolean array marking nodes whose entries in scores are bounds
+        resolve : function
+        """
+        self._propagate_scores()
+        trie = self._internal_trie
+        best = np.maximum(trie.view('best_ancestor_score'),
+                          trie.view('best_descendent_score'))
+        denominator = best + smoothing_param - 1
+        acro_scores = np.divide(trie.view('score') - 1, denominator,
+                                out=np.zeros(len(trie)),
+                                where=denominator > 0)
         if not use_alignment_based_scoring:
-            def score_func(node):
-                return scaled_score(node), node.count
-        else:
-            if not self._alignment_scores_computed:
-                self.compute_alignment_scores()
-                self._alignment_scores_computed = True
-
-            def score_func(node):
-                acro_score = scaled_score(node)
-                phi = np.exp(-weight_decay_param *
-                             max(0, node.best_ancestor_score - 1,
-                                 node.best_descendent_score - 1))
-                score = phi*node.alignment_score + (1-phi)*acro_score
-                return score, node.count
-        return score_func
+            return acro_scores, np.zeros(len(trie), dtype=bool), \
+                lambda nodes: None
+        max_alignment = self._alignment_upper_bound()
+        if 0 in trie.aligned and (n_jobs != 1 or
+                                  max_alignment == float('inf')):
+            self.compute_alignment_scores(n_jobs=n_jobs,
+                                          **(self._alignment_params or {}))
+        alignment_func = self._get_alignment_function()
+        phi = np.exp(-weight_decay_param*np.maximum(0, best - 1))
+        scores = phi*trie.view('alignment_score') + (1-phi)*acro_scores
+        pending = trie.view('aligned') == 0
+        scores[pending] = phi[pending]*max_alignment + \
+            (1-phi[pending])*acro_scores[pending]
+
+        def resolve(nodes):
+            for node in nodes.tolist():
+                alignment_func(node)
+            alignment = trie.view('alignment_score')[nodes]
+            scores[nodes] = phi[nodes]*alignment + \
+                (1-phi[nodes])*acro_scores[nodes]
+            pending[nodes] = False
+        return scores, pending, resolve
+
+    def _alignment_upper_bound(self):
+        """Return upper bound on alignment scores for current parameters
+
+        Alignment scores are at most 1 when penalties and word scores are
+        nonnegative and leading stopwords are penalized rather than rewarded.
+        """
+        abs_ = AlignmentBasedScorer(self.shortform,
+                                    **(self._alignment_params or {}))
+        if abs_.zeta <= 1 and min(abs_.penalties, default=0) >= 0 and \
+           min(abs_.word_scores.values(), default=0) >= 0:
+            return 1.0
+        return float('inf')
+
+    def _get_bounds(self, smoothing_param, use_alignment_based_scoring,
+                    weight_decay_param):
+        """Returns array bounding the scores of each node and its descendents
+
+        Counts and best ancestor likelihood scores are monotone along paths
+        from the root, and the likelihood score of a node never exceeds its
+        count, which gives a bound on scaled likelihood scores and on the
+        weight of the alignment score. Must be called after scores have been
+        computed, so that propagated scores are up to date. Returns None if
+        no finite bound is available.
+        """
+        trie = self._internal_trie
+        if smoothing_param <= 0 or weight_decay_param < 0:
+            return None
+        count = trie.view('count')
+        denominator = count + smoothing_param - 1
+        acro_bounds = np.maximum(0, np.divide(count - 1, denominator,
+                                              out=np.zeros(len(trie)),
+                                              where=denominator > 0))
+        if not use_alignment_based_scoring:
+            return acro_bounds
+        max_alignment = self._alignment_upper_bound()
+        if max_alignment == float('inf'):
+            return None
+        phi = np.exp(-weight_decay_param *
+                     np.maximum(0, trie.view('best_ancestor_score') - 1))
+        return np.maximum(acro_bounds,
+                          phi*max_alignment + (1-phi)*acro_bounds)
 
     def _make_readable(self, tokens):
         """Convert longform from internal representation to a human readable one
@@ -644,31 +1548,300 @@ class AdeftMiner(object):
         out['internal_trie'] = self._internal_trie.to_dict()
         out['stemmer'] = self._stemmer.dump()
         out['window'] = self.window
+        out['count_error_bound'] = self.count_error_bound
         return out
 
-    def dump(self, f):
-        """Serialize AdeftMiner to json into file f"""
-        json.dump(self.to_dict(), f)
+    def dump(self, f, binary=False):
+        """Serialize AdeftMiner into file f
 
-    def update(self, adeft_miner):
-        """Compose two adeft miners trained on separate texts"""
-        self._stemmer.counts.update(adeft_miner._stemmer.counts)
-        stack = [(self._internal_trie,
-                  deepcopy(adeft_miner._internal_trie))]
+        Parameters
+        ----------
+        f : file
+            File object opened for writing. Must be opened in binary mode if
+            binary is True.
+        binary : Optional[bool]
+            If True, the miner is written in a compact binary format. Tokens
+            are stored once, and each candidate is stored as fixed size
+            records of its parent, token and counts rather than as a nested
+            dictionary containing its full longform. Otherwise the miner is
+            written as json. Both formats can be read by load_adeft_miner.
+            Default: False
+        """
+        if binary:
+            self._write_binary(f)
+        else:
+            json.dump(self.to_dict(), f)
+
+    def _write_binary(self, f, metadata=None):
+        """Write binary serialization with optional json metadata"""
+        header = json.dumps({'shortform': self.shortform,
+                             'window': self.window,
+                             'stemmer': self._stemmer.dump(),
+                             'count_error_bound': self.count_error_bound,
+                             'metadata': metadata}).encode('utf-8')
+        f.write(_binary_magic)
+        f.write(struct.pack('<IQ', _binary_version, len(header)))
+        f.write(header)
+        self._internal_trie.write(f)
+
+    def update(self, adeft_miner, consume=False):
+        """Compose two adeft miners trained on separate texts
+
+        Candidates found by both miners are merged node by node. Subtrees of
+        candidates found only in adeft_miner are appended to this miner's
+        trie without further lookups, so the work done is proportional to the
+        number of nodes in adeft_miner's trie.
+
+        Parameters
+        ----------
+        adeft_miner : :py:class:`adeft.discover.AdeftMiner`
+            Miner for the same shortform trained on separate texts
+        consume : Optional[bool]
+            If True, adeft_miner is left empty once merged, releasing the
+            memory held by its trie. If False, adeft_miner is unchanged.
+            Default: False
+        """
+        self._stemmer.update(adeft_miner._stemmer)
+        left_trie, right_trie = self._internal_trie, adeft_miner._internal_trie
+        # Token ids of the other trie mapped to token ids of this trie
+        token_map = [left_trie.intern(token) for token in right_trie.tokens]
+        stack = [(0, 0, False)]
         while stack:
-            left, right = stack.pop()
-            for token, child in right.children.items():
-                if token not in left.children:
-                    left.children[token] = child
-                    if not left.is_root():
-                        left.update_likelihood(child.count, child.count)
+            left, right, new = stack.pop()
+            for child in right_trie.children(right):
+                token_id = token_map[right_trie.token[child]]
+                count = right_trie.count[child]
+                if new:
+                    # Nodes below a newly added node are copied as they are
+                    current = left_trie.add_child(left, token_id, count,
+                                                  right_trie.sum_ft[child],
+                                                  right_trie.sum_ft2[child])
+                    stack.append((current, child, True))
+                    continue
+                current = left_trie.child(left, token_id)
+                if current < 0:
+                    current = left_trie.add_child(left, token_id, count,
+                                                  right_trie.sum_ft[child],
+                                                  right_trie.sum_ft2[child])
+                    if left:
+                        left_trie.update_likelihood(left, count, count)
+                    stack.append((current, child, True))
                 else:
-                    current = left.children[token]
-                    current.increment_count(child.count)
-                    if not left.is_root():
-                        count1, count2 = current.count, child.count
-                        left.update_likelihood(count1, count2)
-                    stack.append((current, child))
+                    left_trie.increment_count(current, count)
+                    if left:
+                        left_trie.update_likelihood(left,
+                                                    left_trie.count[current],
+                                                    count)
+                    stack.append((current, child, False))
+        self.count_error_bound += adeft_miner.count_error_bound
+        if consume:
+            adeft_miner._internal_trie = _CompactTrie()
+            adeft_miner._stemmer = WatchfulStemmer()
+            adeft_miner.count_error_bound = 0
+        self._enforce_budget()
+
+
+class MultiAdeftMiner(object):
+    """Finds candidate longforms for many shortforms in one pass over a corpus
+
+    Each text is scanned a single time for the defining patterns of all
+    shortforms, and the candidates found are routed to a separate
+    :py:class:`AdeftMiner` for each shortform. The miners share a cache of
+    word stems, so each distinct word is stemmed only once across all
+    shortforms, while word counts used to produce readable longforms are
+    kept separately for each shortform. After processing, each miner is in
+    the same state as if it had processed the corpus on its own.
+
+    Parameters
+    ----------
+    shortforms : iterable of str
+        Shortforms to find longforms for
+
+    window : Optional[int]
+        Specifies range of characters before a defining pattern (DP)
+        to consider when finding longforms. See :py:class:`AdeftMiner`.
+        Default: 100
+
+    max_nodes : Optional[int]
+        Node budget for the trie of each shortform. See
+        :py:class:`AdeftMiner`. Default: None
+
+    max_memory : Optional[int]
+        Memory budget in bytes for the trie of each shortform. See
+        :py:class:`AdeftMiner`. Default: None
+
+    Attributes
+    ----------
+    miners : dict
+        Maps each shortform to its :py:class:`AdeftMiner`
+    """
+    def __init__(self, shortforms, window=100, max_nodes=None,
+                 max_memory=None):
+        self.window = window
+        self.max_nodes = max_nodes
+        self.max_memory = max_memory
+        self._stem_cache = {}
+        self.miners = {}
+        for shortform in shortforms:
+            miner = AdeftMiner(shortform, window=window, max_nodes=max_nodes,
+                               max_memory=max_memory)
+            miner._stemmer = WatchfulStemmer(cache=self._stem_cache)
+            self.miners[shortform] = miner
+        self._pattern = defining_pattern_regex(self.miners)
+
+    def __getitem__(self, shortform):
+        return self.miners[shortform]
+
+    def process_texts(self, texts, n_jobs=1, batch_size=1000):
+        """Update longform candidate scores for all shortforms from a corpus
+
+        Parameters
+        ----------
+        texts : iterable of str
+            A list of texts
+        n_jobs : Optional[int]
+            Number of processes to use. If greater than one, the texts are
+            split into consecutive shards processed in worker processes and
+            the results are merged in order. Default: 1
+        batch_size : Optional[int]
+            Number of texts for which candidates are collected before they are
+            added to the tries. See :py:meth:`AdeftMiner.process_texts`.
+            Default: 1000
+        """
+        if n_jobs != 1:
+            texts = list(texts)
+            if n_jobs is None or n_jobs < 0:
+                n_jobs = os.cpu_count() or 1
+            n_jobs = min(n_jobs, len(texts))
+        if n_jobs > 1:
+            shard_size = -(-len(texts) // n_jobs)
+            results = Parallel(n_jobs=n_jobs)(
+                delayed(_process_multi_shard)(list(self.miners), self.window,
+                                              texts[start:start+shard_size],
+                                              batch_size, self.max_nodes,
+                                              self.max_memory)
+                for start in range(0, len(texts), shard_size))
+            for result in results:
+                self.update(result, consume=True)
+            return
+        candidates = {shortform: Counter() for shortform in self.miners}
+        for index, text in enumerate(texts):
+            fragments = get_candidate_fragments_multi(text, self._pattern,
+                                                      self.window)
+            for shortform, shortform_fragments in fragments.items():
+                counts = candidates[shortform]
+                for fragment in shortform_fragments:
+                    candidate, _ = get_candidate(fragment)
+                    counts[tuple(candidate)] += 1
+            if (index + 1) % batch_size == 0:
+                self._add_batches(candidates)
+                candidates = {shortform: Counter()
+                              for shortform in self.miners}
+        self._add_batches(candidates)
+
+    def _add_batches(self, candidates):
+        for shortform, counts in candidates.items():
+            if counts:
+                miner = self.miners[shortform]
+                miner._add_batch(counts)
+                miner._enforce_budget()
+
+    def update(self, multi_miner, consume=False):
+        """Merge a multi-miner trained on separate texts into this one
+
+        Parameters
+        ----------
+        multi_miner : :py:class:`adeft.discover.MultiAdeftMiner`
+            Miner for the same shortforms trained on separate texts
+        consume : Optional[bool]
+            If True, multi_miner is left empty once merged. Default: False
+        """
+        if set(multi_miner.miners) != set(self.miners):
+            raise ValueError('Cannot merge miners for different shortforms')
+        for shortform, miner in self.miners.items():
+            miner.update(multi_miner.miners[shortform], consume=consume)
+        self._stem_cache.update(multi_miner._stem_cache)
+
+
+def _read_texts(path, offset=0, text_key='text'):
+    """Yield texts in a file with the file position following each one
+
+    Parameters
+    ----------
+    path : str
+        Path to a jsonl file or plain text file with one text per line
+    offset : Optional[int]
+        File position at which to start reading. Default: 0
+    text_key : Optional[str]
+        Key of texts in objects of a jsonl file. Default: 'text'
+    """
+    is_jsonl = path.endswith('.jsonl')
+    with open(path, 'rb') as f:
+        f.seek(offset)
+        for line in f:
+            offset += len(line)
+            line = line.decode('utf-8').rstrip('\r\n')
+            if is_jsonl:
+                if not line.strip():
+                    continue
+                text = json.loads(line)
+                if isinstance(text, dict):
+                    text = text[text_key]
+            else:
+                text = line
+            yield text, offset
+
+
+def _process_shard(shortform, window, texts, batch_size, max_nodes=None,
+                   max_memory=None):
+    """Return a new AdeftMiner that has processed a shard of texts"""
+    miner = AdeftMiner(shortform, window=window, max_nodes=max_nodes,
+                       max_memory=max_memory)
+    miner.process_texts(texts, batch_size=batch_size)
+    return miner
+
+
+def _process_multi_shard(shortforms, window, texts, batch_size,
+                         max_nodes=None, max_memory=None):
+    """Return a new MultiAdeftMiner that has processed a shard of texts"""
+    multi_miner = MultiAdeftMiner(shortforms, window=window,
+                                  max_nodes=max_nodes, max_memory=max_memory)
+    multi_miner.process_texts(texts, batch_size=batch_size)
+    return multi_miner
+
+
+def _score_subtrees(shortform, params, subtrees):
+    """Return alignment scores for nodes of subtrees of a candidate trie
+
+    Parameters
+    ----------
+    shortform : str
+        Shortform of the miner
+    params : dict
+        Parameters for py:class`AlignmentBasedScorer`
+    subtrees : list of tuple
+        Triples containing the tokens and depths of the nodes of a subtree in
+        preorder, with the root at depth 1, and the scorer state of the
+        root's parent.
+
+    Returns
+    -------
+    list of array
+        Alignment scores for the nodes of each subtree in preorder
+    """
+    abs_ = AlignmentBasedScorer(shortform, **params)
+    result = []
+    for tokens, depths, data in subtrees:
+        # Scorer states along the path from the parent of the root
+        path = [data]
+        scores = array('d')
+        for token, depth in zip(tokens, depths):
+            del path[depth:]
+            new_data = abs_._next_score(token, *path[-1])
+            path.append(new_data)
+            scores.append(new_data[0])
+        result.append(scores)
+    return result
 
 
 def load_adeft_miner_from_dict(dictionary):
@@ -686,18 +1859,89 @@ def load_adeft_miner_from_dict(dictionary):
     """
     shortform = dictionary['shortform']
     out = AdeftMiner(shortform, window=dictionary['window'])
-    out._internal_trie = load_trie(dictionary['internal_trie'], shortform)
-    out._stemmer = WatchfulStemmer(dictionary['stemmer'])
+    out._load_state(dictionary)
     return out
 
 
-def compose(*adeft_miners):
-    output = deepcopy(adeft_miners[0])
+def compose(*adeft_miners, consume=False):
+    """Return an AdeftMiner combining miners trained on separate texts
+
+    Parameters
+    ----------
+    *adeft_miners : :py:class:`adeft.discover.AdeftMiner`
+        Miners for the same shortform
+    consume : Optional[bool]
+        If True, the trie of the first miner is reused for the output and
+        the other miners are emptied as they are merged. The input miners are
+        left empty. If False, the input miners are unchanged.
+        Default: False
+
+    Returns
+    -------
+    py:class`AdeftMiner`
+    """
+    first = adeft_miners[0]
+    output = AdeftMiner(first.shortform, window=first.window)
+    if consume:
+        output._internal_trie = first._internal_trie
+        output._stemmer = first._stemmer
+        output.count_error_bound = first.count_error_bound
+        first._internal_trie = _CompactTrie()
+        first._stemmer = WatchfulStemmer()
+        first.count_error_bound = 0
+    else:
+        output.update(first)
     for miner in adeft_miners[1:]:
-        output.update(miner)
+        output.update(miner, consume=consume)
     return output
 
 
 def load_adeft_miner(f):
-    """Load AdeftMiner from file f"""
-    return load_adeft_miner_from_dict(json.load(f))
+    """Load AdeftMiner from file f
+
+    Parameters
+    ----------
+    f : file
+        File containing an AdeftMiner serialized with its dump method. Files
+        in binary format must be opened in binary mode. Json files may be
+        opened in either mode.
+
+    Returns
+    -------
+    py:class`AdeftMiner`
+    """
+    start = f.read(len(_binary_magic))
+    if start == _binary_magic:
+        miner, _ = _read_binary(f)
+        return miner
+    if isinstance(start, bytes):
+        start = (start + f.read()).decode('utf-8')
+    else:
+        start += f.read()
+    return load_adeft_miner_from_dict(json.loads(start))
+
+
+def _read_binary(f):
+    """Read binary serialization following the magic bytes
+
+    Returns
+    -------
+    miner : py:class`AdeftMiner`
+    metadata : dict or None
+    """
+    version, header_length = struct.unpack('<IQ', _read_exactly(f, 12))
+    if version > _binary_version:
+        raise ValueError('Unsupported AdeftMiner format version %s' % version)
+    header = json.loads(_read_exactly(f, header_length).decode('utf-8'))
+    miner = AdeftMiner(header['shortform'], window=header['window'])
+    miner._stemmer = WatchfulStemmer(header['stemmer'])
+    miner._internal_trie = _CompactTrie.read(f)
+    miner.count_error_bound = header.get('count_error_bound', 0)
+    return miner, header['metadata']
+
+
+def _read_exactly(f, size):
+    data = f.read(size)
+    if len(data) != size:
+        raise ValueError('Unexpected end of AdeftMiner file')
+    return data
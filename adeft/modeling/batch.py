@@ -0,0 +1,223 @@
+"""Train disambiguation models for many shortforms in parallel.
+
+Labeling, crossvalidation, and serialization of each model are run as a
+separate job in a pool of worker processes. Each model is written to the
+output directory atomically, so an interrupted run can be resumed by calling
+:py:func:`train_disambiguators` again with the same manifest and output path.
+"""
+import os
+import json
+import uuid
+import shutil
+import queue
+import logging
+from multiprocessing import Process, Queue
+
+from joblib import parallel_backend
+
+from adeft.modeling.label import AdeftLabeler
+from adeft.modeling.classify import AdeftClassifier
+from adeft.disambiguate import AdeftDisambiguator
+
+logger = logging.getLogger(__file__)
+
+
+default_param_grid = {'C': [100.0], 'max_features': [10000]}
+
+
+def train_disambiguators(manifest, output_path, n_jobs=None, cv_jobs=None,
+                         memory_limit=None, param_grid=None, cv=5,
+                         random_state=None):
+    """Label corpora and train disambiguators for a collection of shortforms
+
+    Models that already exist in output_path are skipped, allowing a partially
+    completed run to be resumed.
+
+    Parameters
+    ----------
+    manifest : list of dict or str
+        List of job specifications or path to a json file containing such a
+        list. Each job is a dictionary with keys
+        'model_name' : name under which the disambiguator is saved.
+        'grounding_dict' : grounding dictionary as used by
+        :py:class:`adeft.modeling.label.AdeftLabeler`.
+        'names' : dictionary mapping groundings to canonical names.
+        'pos_labels' : list of positive labels.
+        'corpus' : list of (text, identifier) pairs or path to a json file
+        containing such a list.
+        Jobs may also contain a 'param_grid' entry to override the
+        param_grid argument for an individual model.
+    output_path : str
+        Directory where trained disambiguators will be saved.
+    n_jobs : Optional[int]
+        Total number of cores to use. Default: os.cpu_count()
+    cv_jobs : Optional[int]
+        Number of cores used by the crossvalidation of each model. If None,
+        models are trained in parallel using as many workers as possible and
+        remaining cores are split evenly between workers. Default: None
+    memory_limit : Optional[int]
+        Limit in bytes on the address space of each worker process. Jobs
+        exceeding the limit fail without interrupting other jobs. Only
+        supported on Unix systems. If None, no limit is set. Default: None
+    param_grid : Optional[dict]
+        Grid search parameters passed to
+        :py:meth:`adeft.modeling.classify.AdeftClassifier.cv`.
+        Default: {'C': [100.0], 'max_features': [10000]}
+    cv : Optional[int]
+        Number of folds to use in crossvalidation. Default: 5
+    random_state : Optional[int]
+        Seed used for crossvalidation and model fitting. Default: None
+
+    Returns
+    -------
+    dict
+        Dictionary mapping model names to 'trained' if the model was trained
+        during this run, 'skipped' if it already existed in output_path, or an
+        error message if the job failed.
+    """
+    if isinstance(manifest, str):
+        with open(manifest) as f:
+            manifest = json.load(f)
+    if n_jobs is None:
+        n_jobs = os.cpu_count() or 1
+    if param_grid is None:
+        param_grid = default_param_grid
+    if not os.path.exists(output_path):
+        os.makedirs(output_path)
+    _remove_temporary_dirs(output_path)
+
+    status = {}
+    pending = []
+    seen = set()
+    for job in manifest:
+        model_name = job['model_name']
+        if model_name in seen:
+            raise ValueError('Duplicate model name %s in manifest'
+                             % model_name)
+        seen.add(model_name)
+        if _model_exists(output_path, model_name):
+            status[model_name] = 'skipped'
+        else:
+            pending.append(job)
+    if not pending:
+        return status
+    # Start the largest jobs first so that long running jobs do not hold up
+    # the end of the run
+    pending.sort(key=_job_size, reverse=True)
+    if cv_jobs is None:
+        num_workers = min(len(pending), n_jobs)
+        cv_jobs = max(1, n_jobs // num_workers)
+    else:
+        num_workers = max(1, min(len(pending), n_jobs // cv_jobs))
+    logger.info('Training %s models with %s workers using %s cores each'
+                % (len(pending), num_workers, cv_jobs))
+    tasks = [(job, output_path, cv_jobs, job.get('param_grid', param_grid),
+              cv, random_state) for job in pending]
+    for model_name, error in _run_jobs(tasks, num_workers, memory_limit):
+        if error is None:
+            logger.info('Finished training model %s' % model_name)
+            status[model_name] = 'trained'
+        else:
+            logger.warning('Failed to train model %s: %s'
+                           % (model_name, error))
+            status[model_name] = error
+    return status
+
+
+def _run_jobs(tasks, num_workers, memory_limit):
+    """Run training jobs with at most num_workers running at once
+
+    Each job runs in its own process so that memory is returned to the system
+    between models and so that crossvalidation within a job can itself use
+    multiple processes. Yields (model_name, error) pairs as jobs finish.
+    """
+    tasks = list(tasks)
+    results = Queue()
+    running = {}
+    while tasks or running:
+        while tasks and len(running) < num_workers:
+            task = tasks.pop(0)
+            process = Process(target=_worker,
+                              args=(task, memory_limit, results))
+            process.start()
+            running[task[0]['model_name']] = process
+        try:
+            model_name, error = results.get(timeout=1)
+        except queue.Empty:
+            # Workers killed by the operating system never report back
+            for model_name, process in list(running.items()):
+                if process.exitcode is not None and process.exitcode != 0:
+                    del running[model_name]
+                    yield model_name, ('Worker exited with code %s'
+                                       % process.exitcode)
+            continue
+        if model_name in running:
+            running.pop(model_name).join()
+            yield model_name, error
+
+
+def _worker(task, memory_limit, results):
+    if memory_limit is not None:
+        import resource
+        resource.setrlimit(resource.RLIMIT_AS, (memory_limit, memory_limit))
+    # The loky backend keeps its worker processes alive after use, which
+    # would prevent this process from exiting once the job is done.
+    with parallel_backend('multiprocessing'):
+        result = _train_job(task)
+    results.put(result)
+
+
+def _train_job(task):
+    """Label corpus, train and atomically save a single disambiguator"""
+    job, output_path, cv_jobs, param_grid, cv, random_state = task
+    model_name = job['model_name']
+    try:
+        corpus = job['corpus']
+        if isinstance(corpus, str):
+            with open(corpus) as f:
+                corpus = json.load(f)
+        grounding_dict = job['grounding_dict']
+        labeler = AdeftLabeler(grounding_dict)
+        corpus = labeler.build_from_texts(corpus)
+        if not corpus:
+            return model_name, 'No defining patterns found in corpus'
+        texts, labels, _ = zip(*corpus)
+        classifier = AdeftClassifier(list(grounding_dict.keys()),
+                                     job['pos_labels'],
+                                     random_state=random_state)
+        classifier.cv(texts, labels, param_grid, n_jobs=cv_jobs, cv=cv)
+        disambiguator = AdeftDisambiguator(classifier, grounding_dict,
+                                           job['names'])
+        # Model files are first written to a temporary directory and then
+        # moved into place with a single rename.
+        temp_path = os.path.join(output_path, '.%s.%s.tmp'
+                                 % (model_name, uuid.uuid4().hex))
+        disambiguator.dump(model_name, path=temp_path)
+        os.rename(os.path.join(temp_path, model_name),
+                  os.path.join(output_path, model_name))
+        shutil.rmtree(temp_path)
+    except MemoryError:
+        return model_name, 'Memory limit exceeded'
+    except Exception as e:
+        return model_name, '%s: %s' % (type(e).__name__, e)
+    return model_name, None
+
+
+def _model_exists(output_path, model_name):
+    return os.path.exists(os.path.join(output_path, model_name,
+                                       '%s_model.gz' % model_name))
+
+
+def _remove_temporary_dirs(output_path):
+    """Remove temporary directories left behind by an interrupted run"""
+    for filename in os.listdir(output_path):
+        if filename.startswith('.') and filename.endswith('.tmp'):
+            shutil.rmtree(os.path.join(output_path, filename),
+                          ignore_errors=True)
+
+
+def _job_size(job):
+    corpus = job['corpus']
+    if isinstance(corpus, str):
+        return os.path.getsize(corpus)
+    return sum(len(text) for text, _ in corpus)
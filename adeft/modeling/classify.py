@@ -1,29 +1,43 @@
+import os
 import gzip
 import json
+import uuid
 import logging
+import numbers
 import warnings
 import numpy as np
 from hashlib import md5
 from datetime import datetime
+from scipy.stats import rankdata
+from scipy.sparse import csr_matrix
+from joblib import Parallel, delayed
 from collections import Counter, defaultdict
 
 from sklearn.pipeline import Pipeline
 from sklearn.exceptions import ConvergenceWarning
+from sklearn.preprocessing import normalize
 from sklearn.linear_model import LogisticRegression
-from sklearn.feature_extraction.text import TfidfVectorizer
-from sklearn.model_selection import GridSearchCV, StratifiedKFold
-from sklearn.metrics import f1_score, precision_score, recall_score,\
-    make_scorer
-
+from sklearn.utils.sparsefuncs import mean_variance_axis
+from sklearn.feature_extraction.text import CountVectorizer, \
+    TfidfVectorizer, TfidfTransformer
+from sklearn.model_selection import ParameterGrid, StratifiedKFold, \
+    StratifiedGroupKFold, train_test_split
 
 from adeft import __version__
 from adeft.nlp import english_stopwords
+from adeft.modeling.ngram_stats import NgramStatistics, fit_counts, \
+    transform_counts
 
 warnings.filterwarnings("ignore", category=ConvergenceWarning)
 
 logger = logging.getLogger(__file__)
 
 
+# Parameter values used by cv for parameters not appearing in the grid
+_default_cv_params = {'C': 100.0, 'ngram_range': (1, 2),
+                      'max_features': 1000, 'class_weight': None}
+
+
 class AdeftClassifier(object):
     """Trains classifiers to disambiguate shortforms based on context
 
@@ -66,9 +80,17 @@ class AdeftClassifier(object):
         runs. This information can also be found in the stats dict and is not
         included when models are serialized. Only available if model is fit
         with the cv method.
-    grid_search : py:class:`sklearn.model_selection.GridSearchCV`
-        sklearn gridsearch object if model was fit with cv. This is not
-        included when model is serialized.
+    cv_results : dict
+        Crossvalidation results for each candidate in the parameter grid if
+        model was fit with cv. Follows the format of the cv_results_
+        attribute of sklearn's GridSearchCV. This is not included when model
+        is serialized.
+    grid_search : object
+        Deprecated, use cv_results, params and best_score instead. Object
+        with the cv_results_, best_params_, best_score_, best_index_ and
+        best_estimator_ attributes of the sklearn GridSearchCV object
+        formerly used by cv, with parameter names prefixed by pipeline step
+        as before. None if model was not fit with cv.
     confusion_info : dict
         Contains the confusion matrix for each pair of labels per
         crossvalidation split. Only available if the model has been fit with
@@ -106,15 +128,26 @@ class AdeftClassifier(object):
         self.stop = set(english_stopwords).union([sf.lower() for sf
                                                   in self.shortforms])
         self.best_score = None
-        self.grid_search = None
+        self.cv_results = None
         self.version = __version__
         self._std = None
         self.params = None
         self.timestamp = None
         self.training_set_digest = None
 
+    @property
+    def grid_search(self):
+        warnings.warn('The grid_search attribute is deprecated, use'
+                      ' cv_results, params and best_score instead',
+                      DeprecationWarning, stacklevel=2)
+        if self.cv_results is None:
+            return None
+        return _GridSearchResults(self.cv_results, self.best_score,
+                                  self.estimator)
+
     def train(self, texts, y, C=1.0, ngram_range=(1, 2), max_features=1000,
-              class_weight=None):
+              class_weight=None, sample_weight=None, max_per_label=None,
+              ngram_stats=None):
         """Fits a disambiguation model
 
         Parameters
@@ -144,22 +177,40 @@ class AdeftClassifier(object):
 
             Note that these weights will be multiplied with sample_weight
             (passed through the fit method) if sample_weight is specified.
+        sample_weight : Optional[iterable of float]
+            Weight for each training text, such as the number of times it
+            appeared in the corpus as returned by
+            :py:func:`adeft.modeling.duplicates.collapse_duplicates`. Passed
+            to the logistic regression and used when computing feature
+            standard deviations. If None, all texts have weight one.
+            Default: None
+        max_per_label : Optional[int]
+            If given, at most this many texts are used for each label,
+            chosen by a reservoir sample seeded with random_state. The
+            weights of the texts kept for a label are scaled up by the ratio
+            of its total weight to the weight kept, so that the model is fit
+            as if on the full label distribution. If None, all texts are
+            used. Default: None
+        ngram_stats : Optional[NgramStatistics]
+            An :py:class:`adeft.modeling.ngram_stats.NgramStatistics` store.
+            If given, the store is updated with any training texts it has
+            not yet counted and the tfidf features of the training texts are
+            assembled from the stored ngram counts instead of tokenizing the
+            texts. The vocabulary and idf values are those of the training
+            texts. The store must have been created with this classifier's
+            stop attribute as its stop words. Default: None
         """
+        if ngram_stats is not None:
+            texts = list(texts)
+            ngram_stats.update(texts)
+        if max_per_label is not None:
+            texts, y, sample_weight, _ = \
+                self._cap_per_label(texts, y, max_per_label, sample_weight)
         # Initialize pipeline
-        seed = self.random_state
-        logit_pipeline = \
-            Pipeline([('tfidf',
-                       TfidfVectorizer(ngram_range=ngram_range,
-                                       max_features=max_features,
-                                       stop_words=self.stop)),
-                      ('logit',
-                       LogisticRegression(C=C,
-                                          solver='saga',
-                                          penalty='l1',
-                                          multi_class='auto',
-                                          class_weight=class_weight,
-                                          random_state=seed))])
-        logit_pipeline.fit(texts, y)
+        logit_pipeline = self._make_pipeline(C=C, ngram_range=ngram_range,
+                                             max_features=max_features,
+                                             class_weight=class_weight)
+        self._fit(logit_pipeline, texts, y, sample_weight, ngram_stats)
 
         self.params = {'C': C, 'ngram_grange': ngram_range,
                        'max_features': max_features,
@@ -167,12 +218,81 @@ class AdeftClassifier(object):
                        'random_state': self.random_state}
         self.estimator = logit_pipeline
         self.best_score = None
-        self.grid_search = None
+        self.cv_results = None
         self.timestamp = self._get_current_time()
-        self.training_set_digest = self._training_set_digest(texts)
-        self._set_variance(texts)
 
-    def cv(self, texts, y, param_grid, n_jobs=1, cv=5):
+    def train_from_features(self, X, vocabulary, y, C=1.0, class_weight=None,
+                            sample_weight=None, ngram_range=None):
+        """Fits a disambiguation model from a precomputed count matrix
+
+        Only the idf values and the logistic regression are fit. The
+        resulting model applies to raw texts and can be serialized like any
+        other, provided the terms in the vocabulary are ngrams as produced by
+        sklearn's default text analyzer, that is lowercase tokens joined by
+        single spaces, with this classifier's stop attribute as stop words.
+
+        Parameters
+        ----------
+        X : array-like or sparse matrix of shape (n_texts, n_features)
+            Ngram counts for each training text
+        vocabulary : dict or list of str
+            Either a dictionary mapping terms to column indices of X or a
+            list of terms for each column of X.
+        y : iterable of str
+            True labels for training texts
+        C : Optional[float]
+            L1 regularization parameter of the logistic regression model.
+            Default: 1.0
+        class_weight : Optional[dict or 'balanced']
+            Weights associated with classes as in the train method.
+            Default: None
+        sample_weight : Optional[iterable of float]
+            Weight for each training text. If None, all texts have weight
+            one. Default: None
+        ngram_range : Optional[tuple of int]
+            Range of ngrams used to compute features for new texts. If None,
+            it is inferred from the number of words in the vocabulary terms.
+            Default: None
+        """
+        if not isinstance(vocabulary, dict):
+            vocabulary = {term: index for index, term in enumerate(vocabulary)}
+        X = csr_matrix(X, dtype=np.float64)
+        if len(vocabulary) != X.shape[1]:
+            raise ValueError('Vocabulary has %s terms but X has %s columns'
+                             % (len(vocabulary), X.shape[1]))
+        if ngram_range is None:
+            lengths = [term.count(' ') + 1 for term in vocabulary]
+            ngram_range = (min(lengths), max(lengths))
+        if sample_weight is not None:
+            sample_weight = np.asarray(sample_weight, dtype=float)
+        y = list(y)
+        estimator = self._make_pipeline(C=C, ngram_range=ngram_range,
+                                        max_features=None,
+                                        class_weight=class_weight)
+        self.training_set_digest = _matrix_digest(X)
+        transformer = TfidfTransformer()
+        X = transformer.fit_transform(X)
+        tfidf = estimator.named_steps['tfidf']
+        tfidf.vocabulary_ = {term: int(index)
+                             for term, index in vocabulary.items()}
+        tfidf.idf_ = transformer.idf_
+        logit = estimator.named_steps['logit']
+        logit.set_params(class_weight=_weighted_class_weight(
+            class_weight, y, sample_weight))
+        logit.fit(X, y, sample_weight=sample_weight)
+        self._set_variance(X, sample_weight)
+        self.params = {'C': C, 'ngram_grange': ngram_range,
+                       'max_features': len(vocabulary),
+                       'class_weight': class_weight,
+                       'random_state': self.random_state}
+        self.estimator = estimator
+        self.best_score = None
+        self.cv_results = None
+        self.timestamp = self._get_current_time()
+
+    def cv(self, texts, y, param_grid, n_jobs=1, cv=5, search='grid',
+           halving_factor=3, cache_path=None, sample_weight=None,
+           groups=None, max_per_label=None, ngram_stats=None):
         """Performs grid search to select and fit a disambiguation model
 
         Parameters
@@ -183,12 +303,75 @@ class AdeftClassifier(object):
             True labels for the training texts
         param_grid : Optional[dict]
           Grid search parameters. Can contain all parameters from the train
-          method.
+          method. Within each crossvalidation split, candidates differing
+          only in the value of C are fit in order of increasing C, with
+          each fit warm started from the solution of the previous one.
         n_jobs : Optional[int]
-            Number of jobs to use when performing grid_search
-            Default: 1
+            Number of jobs to use when performing grid search. Fits are
+            distributed over crossvalidation splits and regularization
+            paths. Default: 1
         cv : Optional[int]
             Number of folds to use in crossvalidation. Default: 5
+        search : Optional[str]
+            Either 'grid' or 'halving'. If 'grid', every candidate in the
+            parameter grid is crossvalidated on the full training set. If
+            'halving', successive halving is used: all candidates are first
+            crossvalidated on a small stratified subsample of the training
+            set and only the best 1/halving_factor of them are promoted to
+            a subsample halving_factor times larger, until the remaining
+            candidates are crossvalidated on the full training set. Model
+            statistics are those of the selected candidate on the full
+            training set. Default: 'grid'
+        halving_factor : Optional[int]
+            Factor by which the number of candidates is reduced and the
+            number of training examples increased in each round of
+            successive halving. Must be an integer greater than 1.
+            Default: 3
+        cache_path : Optional[str]
+            Directory in which to cache the scores of each candidate on each
+            crossvalidation split as they are computed. Scores are stored in
+            a subdirectory named by the training set digest and keyed by the
+            order and labels of the training data, the crossvalidation split,
+            the random_state, the candidate's parameters and the smaller
+            values of C fit before it on its warm started regularization
+            path. When cv is rerun, for instance after an interruption or
+            with additional parameter values, cached scores are reused and
+            only paths with new fits are refit, so results do not depend on
+            what was cached before. Requires random_state to be set. If
+            None, nothing is cached. Default: None
+        sample_weight : Optional[iterable of float]
+            Weight for each training text. Weights are used when fitting
+            each model and when counting test examples in crossvalidation
+            metrics, so that a text with weight n is scored as if it appeared
+            n times. If None, all texts have weight one. Default: None
+        groups : Optional[iterable of int]
+            Group label for each training text. Texts in the same group are
+            never split between the training and test sets of a
+            crossvalidation split. Use the groups returned by
+            :py:func:`adeft.modeling.duplicates.collapse_duplicates` to keep
+            duplicates and near duplicates from inflating crossvalidation
+            scores. If None, folds are stratified by label only.
+            Default: None
+        max_per_label : Optional[int]
+            If given, crossvalidation and the final fit use at most this
+            many texts for each label, chosen by a reservoir sample seeded
+            with random_state. Weights of the kept texts are scaled up to
+            compensate, so crossvalidation metrics and confusion counts
+            estimate those on the full training set. The label distribution
+            in stats is that of the full training set. If None, all texts
+            are used. Default: None
+        ngram_stats : Optional[NgramStatistics]
+            An :py:class:`adeft.modeling.ngram_stats.NgramStatistics` store.
+            Texts are tokenized once and the tfidf features of each
+            crossvalidation split and of the final fit are assembled from
+            their ngram counts, with vocabulary and idf values computed from
+            the training texts of the split or fit. If a store is given, it
+            is updated with any training texts it has not yet counted, so
+            only new texts are tokenized, and is kept for later calls.
+            Results do not depend on whether a store is given. Its ngram
+            range must contain those in the parameter grid and its stop
+            words must be this classifier's stop attribute. If None, a
+            temporary store is used. Default: None
 
         Example
         -------
@@ -198,75 +381,72 @@ class AdeftClassifier(object):
         >>> classifier = LongformClassifier('IR', ['insulin receptor'])
         >>> classifier.train(texts, labels, param_grid=params, n_jobs=4)
         """
-        # Initialize pipeline
-        seed = self.random_state
-        logit_pipeline = Pipeline([('tfidf',
-                                    TfidfVectorizer(ngram_range=(1, 2),
-                                                    max_features=1000,
-                                                    stop_words=self.stop)),
-                                   ('logit',
-                                    LogisticRegression(C=100.,
-                                                       solver='saga',
-                                                       penalty='l1',
-                                                       multi_class='auto',
-                                                       random_state=seed))])
-
-        # Create scorer for use in grid search. Best params decided using
-        # f1 score. The positive labels are specified when the classifier is
-        # initialized. Uses micro-average f1, precision, and recall scores.
-        # This means metrics are calculated globally by counting all true
-        # positives, false negatives, and false positives
-        f1_scorer = make_scorer(f1_score, labels=self.pos_labels,
-                                average='micro')
-        pr_scorer = make_scorer(precision_score,
-                                labels=self.pos_labels,
-                                average='micro')
-        rc_scorer = make_scorer(recall_score,
-                                labels=self.pos_labels,
-                                average='micro')
-
-        scorer = {'f1': f1_scorer,
-                  'pr': pr_scorer,
-                  'rc': rc_scorer}
+        if search == 'halving' and (
+                isinstance(halving_factor, bool) or
+                not isinstance(halving_factor, numbers.Integral) or
+                halving_factor < 2):
+            raise ValueError('halving_factor must be an integer greater'
+                             ' than 1')
         all_labels = sorted(set(y))
-        for label in all_labels:
-            f1 = make_scorer(f1_score, labels=[label], average=None)
-            pr = make_scorer(recall_score, labels=[label], average=None)
-            rc = make_scorer(precision_score, labels=[label], average=None)
-            scorer.update({'f1_%s' % label: f1,
-                           'pr_%s' % label: pr,
-                           'rc_%s' % label: rc})
-        for label1 in all_labels:
-            for label2 in all_labels:
-                count_score = make_scorer(_count_score, label1=label1,
-                                          label2=label2)
-                scorer['count_%s_%s' % (label1, label2)] = count_score
         logger.info('Beginning grid search in parameter space:\n'
                     '%s' % param_grid)
+        candidates = list(ParameterGrid(param_grid))
+        ngram_ranges = [dict(_default_cv_params, **candidate)['ngram_range']
+                        for candidate in candidates]
+        if ngram_stats is not None:
+            for ngram_range in set(map(tuple, ngram_ranges)):
+                pipeline = self._make_pipeline(ngram_range=ngram_range)
+                ngram_stats.check_vectorizer(pipeline.named_steps['tfidf'])
 
-        param_mapping = {'C': 'logit__C',
-                         'class_weight': 'logit__class_weight',
-                         'max_features': 'tfidf__max_features',
-                         'ngram_range':  'tfidf__ngram_range'}
-        inverse_param_mapping = {value: key
-                                 for key, value in param_mapping.items()}
-
-        param_grid = {param_mapping[key]: value
-                      for key, value in param_grid.items()}
+        texts = list(texts)
+        y = list(y)
+        if sample_weight is not None:
+            sample_weight = np.asarray(sample_weight, dtype=float)
+        if groups is not None:
+            groups = np.asarray(groups)
+        if ngram_stats is not None:
+            ngram_stats.update(texts)
+        # The label distribution is recorded before any subsampling
+        labels = _label_totals(y, sample_weight)
+        labels = {label: _as_count(total) for label, total in labels.items()}
+        if max_per_label is not None:
+            texts, y, sample_weight, groups = \
+                self._cap_per_label(texts, y, max_per_label, sample_weight,
+                                    groups)
+        if ngram_stats is None:
+            ngram_stats = NgramStatistics(
+                ngram_range=(min(min_n for min_n, _ in ngram_ranges),
+                             max(max_n for _, max_n in ngram_ranges)),
+                stop_words=self.stop)
+            ngram_stats.update(texts)
         num_splits = cv
-        cv = StratifiedKFold(n_splits=cv, shuffle=True, random_state=seed)
-        # Fit grid_search and set the estimator for the instance of the class
-        grid_search = GridSearchCV(logit_pipeline, param_grid,
-                                   cv=cv, n_jobs=n_jobs, scoring=scorer,
-                                   refit='f1',
-                                   return_train_score=False)
-        grid_search.fit(texts, y)
-        logger.info('Best f1 score of %s found for' % grid_search.best_score_
-                    + ' parameter values:\n%s' % grid_search.best_params_)
-
-        cv = grid_search.cv_results_
-        best_index = cv['rank_test_f1'][0] - 1
-        labels = dict(Counter(y))
+        if cache_path is not None:
+            if self.random_state is None:
+                raise ValueError('random_state must be set to cache'
+                                 ' crossvalidation results')
+            cache = _CVCache(os.path.join(cache_path,
+                                          self._training_set_digest(texts)))
+        else:
+            cache = None
+        if search == 'grid':
+            cv_results = self._grid_search(texts, y, candidates, num_splits,
+                                           all_labels, n_jobs, ngram_stats,
+                                           cache, sample_weight, groups)
+        elif search == 'halving':
+            cv_results = self._halving_search(texts, y, candidates,
+                                              num_splits, all_labels, n_jobs,
+                                              halving_factor, ngram_stats,
+                                              cache, sample_weight, groups)
+        else:
+            raise ValueError("search must be one of 'grid' or 'halving'")
+        candidates = cv_results['params']
+        best_index = int(np.argmin(cv_results['rank_test_f1']))
+        best_params = candidates[best_index]
+        best_score = cv_results['mean_test_f1'][best_index]
+        logger.info('Best f1 score of %s found for' % best_score
+                    + ' parameter values:\n%s' % best_params)
+
+        cv = cv_results
         stats = {'label_distribution': labels,
                  'f1': {'mean':
                         np.round(cv['mean_test_f1'][best_index], 6),
@@ -304,21 +484,263 @@ class AdeftClassifier(object):
             for label2 in all_labels:
                 for i in range(num_splits):
                     key = 'split%s_test_count_%s_%s' % (i, label1, label2)
-                    val = int(cv[key][best_index])
+                    val = _as_count(cv[key][best_index])
                     confusion[label1][label2].append(val)
         confusion = {key: dict(value) for key, value in confusion.items()}
-        params = {inverse_param_mapping[key]: value for key, value
-                  in grid_search.best_params_.items()}
+        params = dict(_default_cv_params, **best_params)
+        estimator = self._make_pipeline(**params)
+        self._fit(estimator, texts, y, sample_weight, ngram_stats)
+        params = dict(best_params)
         params['random_state'] = self.random_state
         self.params = params
-        self.estimator = grid_search.best_estimator_
-        self.best_score = grid_search.best_score_
-        self.grid_search = grid_search
+        self.estimator = estimator
+        self.best_score = best_score
+        self.cv_results = cv_results
         self.stats = stats
         self.confusion_info = confusion
         self.timestamp = self._get_current_time()
-        self.training_set_digest = self._training_set_digest(texts)
-        self._set_variance(texts)
+
+    def _grid_search(self, texts, y, candidates, num_splits, labels, n_jobs,
+                     ngram_stats, cache=None, sample_weight=None,
+                     groups=None):
+        """Crossvalidate a list of candidate parameter settings
+
+        Features for each split are assembled from the ngram counts of the
+        texts in ngram_stats. If a cache is given, scores for splits and
+        candidates found in it are reused. A regularization path is refit up
+        to its last uncached candidate, so each fit is warm started from the
+        same solutions as without the cache. If groups are given, folds are
+        stratified by label while keeping each group within a single fold.
+
+        Returns
+        -------
+        dict
+            Crossvalidation results in the format of the cv_results_
+            attribute of sklearn's GridSearchCV.
+        """
+        seed = self.random_state
+        if groups is None:
+            cv = StratifiedKFold(n_splits=num_splits, shuffle=True,
+                                 random_state=seed)
+        else:
+            cv = StratifiedGroupKFold(n_splits=num_splits, shuffle=True,
+                                      random_state=seed)
+        splits = list(cv.split(texts, y, groups))
+        # Candidates sharing the same featurization and class weights lie on
+        # a common regularization path. Within each fold these are fit in
+        # order of increasing C, with each fit warm started from the solution
+        # of the previous one.
+        paths = defaultdict(list)
+        for index, candidate in enumerate(candidates):
+            params = dict(_default_cv_params, **candidate)
+            key = tuple((name, repr(value))
+                        for name, value in sorted(params.items())
+                        if name != 'C')
+            paths[key].append((params['C'], index))
+        paths = [sorted(path, key=lambda x: x[0]) for path in paths.values()]
+        results = {}
+        keys = {}
+        if cache is not None:
+            data_digest = _ordered_digest(texts, y, sample_weight, groups)
+            for split_index in range(num_splits):
+                for path in paths:
+                    for position, (_, index) in enumerate(path):
+                        key = self._cache_key(data_digest, num_splits,
+                                              split_index, candidates[index],
+                                              [C for C, _ in path[:position]])
+                        keys[split_index, index] = key
+                        cached = cache.get(key)
+                        if cached is not None:
+                            results[split_index, index] = cached
+        tasks = []
+        for split_index in range(num_splits):
+            for path in paths:
+                path = [index for _, index in path]
+                uncached = [position for position, index in enumerate(path)
+                            if (split_index, index) not in results]
+                if uncached:
+                    tasks.append((split_index, path[:uncached[-1] + 1]))
+        if cache is not None:
+            logger.info('Found cached scores for %s of %s fits, performing'
+                        ' %s fits'
+                        % (len(results), num_splits*len(candidates),
+                           sum(len(path) for _, path in tasks)))
+        counts, terms = ngram_stats.count_matrix(texts)
+        task_results = Parallel(n_jobs=n_jobs)(
+            delayed(_fit_regularization_path)(
+                counts, terms, y, splits[split_index],
+                [candidates[index] for index in path],
+                labels, self.pos_labels, seed, cache,
+                [keys.get((split_index, index)) for index in path],
+                sample_weight)
+            for split_index, path in tasks)
+        for (split_index, path), path_scores in zip(tasks, task_results):
+            for index, candidate_scores in zip(path, path_scores):
+                results[split_index, index] = candidate_scores
+        scores = defaultdict(lambda: np.zeros((num_splits, len(candidates))))
+        for (split_index, index), candidate_scores in results.items():
+            for name, value in candidate_scores.items():
+                scores[name][split_index, index] = value
+        cv_results = {'params': candidates}
+        for name, split_scores in scores.items():
+            for i in range(num_splits):
+                cv_results['split%s_test_%s' % (i, name)] = split_scores[i]
+            cv_results['mean_test_%s' % name] = split_scores.mean(axis=0)
+            cv_results['std_test_%s' % name] = split_scores.std(axis=0)
+            cv_results['rank_test_%s' % name] = \
+                rankdata(-split_scores.mean(axis=0),
+                         method='min').astype(np.int32)
+        return cv_results
+
+    def _cache_key(self, data_digest, num_splits, split_index, candidate,
+                   path_prefix=()):
+        """Return key identifying the scores of a candidate on a split
+
+        The fit of a candidate is warm started from the solution for the
+        previous value of C on its regularization path, so the values of C
+        preceding it on the path, given in path_prefix, are part of the key.
+        """
+        params = dict(_default_cv_params, **candidate)
+        key = {'data': data_digest,
+               'num_splits': num_splits,
+               'split': split_index,
+               'random_state': self.random_state,
+               'params': {name: repr(value) for name, value
+                          in params.items()},
+               'path': [repr(C) for C in path_prefix],
+               'shortforms': sorted(self.shortforms),
+               'pos_labels': sorted(self.pos_labels),
+               'version': __version__}
+        return md5(json.dumps(key, sort_keys=True).encode('utf-8')).hexdigest()
+
+    def _halving_search(self, texts, y, candidates, num_splits, labels,
+                        n_jobs, factor, ngram_stats, cache=None,
+                        sample_weight=None, groups=None):
+        """Select candidate parameter settings by successive halving
+
+        Returns
+        -------
+        dict
+            Crossvalidation results on the full training set for the
+            candidates remaining in the final round, in the format of the
+            cv_results_ attribute of sklearn's GridSearchCV.
+        """
+        num_examples = len(texts)
+        num_rounds = max(1, int(np.ceil(np.log(len(candidates)) /
+                                        np.log(factor))))
+        # Each label should be able to appear in every crossvalidation split
+        # of the smallest subsample
+        min_examples = max(2*num_splits*len(labels),
+                           int(np.ceil(num_examples /
+                                       factor**(num_rounds - 1))))
+        for round_index in range(num_rounds):
+            num_used = min_examples * factor**round_index
+            if (len(candidates) == 1 or round_index == num_rounds - 1 or
+                    num_examples - num_used < len(labels)):
+                num_used = num_examples
+            if num_used < num_examples:
+                indices = _stratified_subsample(y, num_used,
+                                                random_state=self.random_state)
+                subsample_texts = [texts[i] for i in indices]
+                subsample_y = [y[i] for i in indices]
+                subsample_weight = (sample_weight[indices]
+                                    if sample_weight is not None else None)
+                subsample_groups = (groups[indices]
+                                    if groups is not None else None)
+            else:
+                subsample_texts, subsample_y = texts, y
+                subsample_weight, subsample_groups = sample_weight, groups
+            cv_results = self._grid_search(subsample_texts, subsample_y,
+                                           candidates, num_splits, labels,
+                                           n_jobs, ngram_stats, cache,
+                                           subsample_weight,
+                                           subsample_groups)
+            logger.info('Successive halving round %s: crossvalidated %s'
+                        ' candidates on %s examples'
+                        % (round_index + 1, len(candidates), num_used))
+            if num_used == num_examples:
+                break
+            num_kept = int(np.ceil(len(candidates)/factor))
+            kept = np.argsort(-cv_results['mean_test_f1'],
+                              kind='stable')[:num_kept]
+            candidates = [candidates[i] for i in sorted(kept)]
+        return cv_results
+
+    def _cap_per_label(self, texts, y, max_per_label, sample_weight=None,
+                       groups=None):
+        """Subsample training data to at most max_per_label texts per label
+
+        Returns
+        -------
+        texts : list of str
+        y : list of str
+        sample_weight : py:class:`numpy.ndarray`
+            Weights of kept texts, scaled so that the total weight of each
+            label is the same as before subsampling.
+        groups : py:class:`numpy.ndarray` or None
+        """
+        texts, y = list(texts), list(y)
+        if sample_weight is None:
+            sample_weight = np.ones(len(y))
+        sample_weight = np.asarray(sample_weight, dtype=float)
+        totals = _label_totals(y, sample_weight)
+        indices = _reservoir_indices(y, max_per_label, self.random_state)
+        logger.info('Using %s of %s training texts after capping each label'
+                    ' at %s texts' % (len(indices), len(y), max_per_label))
+        texts = [texts[i] for i in indices]
+        y = [y[i] for i in indices]
+        sample_weight = sample_weight[indices]
+        kept = _label_totals(y, sample_weight)
+        sample_weight = sample_weight * np.array([totals[label]/kept[label]
+                                                  for label in y])
+        if groups is not None:
+            groups = np.asarray(groups)[indices]
+        return texts, y, sample_weight, groups
+
+    def _fit(self, estimator, texts, y, sample_weight=None, ngram_stats=None):
+        """Fit pipeline with a single pass over the training texts
+
+        The tfidf matrix for the training set is computed once. It is used to
+        fit the logistic regression model and to compute standard deviations
+        of feature values. md5 hashes of the texts are taken in the same pass
+        to compute the training set digest. If ngram statistics are given,
+        the tfidf matrix is assembled from the stored ngram counts of the
+        texts instead. Sets the training_set_digest and _std attributes.
+        """
+        texts = list(texts)
+        hashes = []
+
+        def hashed_texts():
+            for text in texts:
+                hashes.append(md5(text.encode('utf-8')).hexdigest())
+                yield text
+        tfidf = estimator.named_steps['tfidf']
+        if ngram_stats is not None:
+            X = ngram_stats.fit_transform(tfidf, hashed_texts())
+        else:
+            X = tfidf.fit_transform(hashed_texts())
+        logit = estimator.named_steps['logit']
+        logit.set_params(class_weight=_weighted_class_weight(
+            logit.class_weight, y, sample_weight))
+        logit.fit(X, y, sample_weight=sample_weight)
+        order = sorted(range(len(texts)), key=texts.__getitem__)
+        self.training_set_digest = _combine_hashes(hashes[i] for i in order)
+        self._set_variance(X, sample_weight)
+
+    def _make_pipeline(self, C=1.0, ngram_range=(1, 2), max_features=1000,
+                       class_weight=None):
+        """Return an unfit tfidf/logistic regression pipeline"""
+        return Pipeline([('tfidf',
+                          TfidfVectorizer(ngram_range=ngram_range,
+                                          max_features=max_features,
+                                          stop_words=self.stop)),
+                         ('logit',
+                          LogisticRegression(C=C,
+                                             solver='saga',
+                                             penalty='l1',
+                                             multi_class='auto',
+                                             class_weight=class_weight,
+                                             random_state=self.random_state))])
 
     def predict_proba(self, texts):
         """Predict class probabilities for a list-like of texts"""
@@ -331,26 +753,40 @@ class AdeftClassifier(object):
         """Predict class labels for a list-like of texts"""
         return self.estimator.predict(texts)
 
-    def get_model_info(self):
+    def get_model_info(self, dtype=None):
         """Return a JSON object representing a model for portability.
 
+        Parameters
+        ----------
+        dtype : Optional[str]
+            Either 'float16' or 'float32'. If given, model coefficients,
+            intercepts, idf values and feature standard deviations are
+            rounded to the given precision. Models stored at reduced precision
+            are loaded into float32 arrays and run inference in float32, so
+            their size in memory is half that of full precision models for
+            both dtypes. float16 values take a quarter of the space only on
+            disk. If None, full precision is used. Default: None
+
         Returns
         -------
         dict
             A JSON object representing the attributes of the classifier needed
             to make it portable/serializable and enabling its reload.
         """
+        if dtype not in (None, 'float16', 'float32'):
+            raise ValueError("dtype must be one of None, 'float16', or"
+                             " 'float32'")
         logit = self.estimator.named_steps['logit']
         if not hasattr(logit, 'coef_'):
             raise RuntimeError('Estimator has not been fit.')
         classes_ = logit.classes_.tolist()
-        intercept_ = logit.intercept_.tolist()
-        coef_ = logit.coef_.tolist()
+        intercept_ = _array_to_list(logit.intercept_, dtype)
+        coef_ = _array_to_list(logit.coef_, dtype)
 
         tfidf = self.estimator.named_steps['tfidf']
         vocabulary_ = {term: int(frequency)
                        for term, frequency in tfidf.vocabulary_.items()}
-        idf_ = tfidf.idf_.tolist()
+        idf_ = _array_to_list(tfidf.idf_, dtype)
         ngram_range = tfidf.ngram_range
         model_info = {'logit': {'classes_': classes_,
                                 'intercept_': intercept_,
@@ -366,7 +802,7 @@ class AdeftClassifier(object):
             model_info['stats'] = self.stats
         # These attributes may not exist in older models
         if hasattr(self, '_std') and self._std is not None:
-            model_info['std'] = self._std.tolist()
+            model_info['std'] = _array_to_list(self._std, dtype)
         if hasattr(self, 'timestamp') and self.timestamp is not None:
             model_info['timestamp'] = self.timestamp
         if hasattr(self, 'training_set_digest') and \
@@ -380,22 +816,59 @@ class AdeftClassifier(object):
             model_info['confusion_info'] = self.confusion_info
         if hasattr(self, 'other_metadata') and self.other_metadata is not None:
             model_info['other_metadata'] = self.other_metadata
+        if dtype is not None:
+            model_info['dtype'] = dtype
         return model_info
 
-    def dump_model(self, filepath):
+    def dump_model(self, filepath, dtype=None):
         """Serialize model to gzipped json
 
         Parameters
         ----------
         filepath : str
            Path to output file
+        dtype : Optional[str]
+            Either 'float16' or 'float32'. If given, model arrays are stored
+            at reduced precision. Loaded models hold them in float32 in
+            either case. See get_model_info. Default: None
         """
-        model_info = self.get_model_info()
+        model_info = self.get_model_info(dtype=dtype)
         json_str = json.dumps(model_info)
         json_bytes = json_str.encode('utf-8')
         with gzip.GzipFile(filepath, 'w') as fout:
             fout.write(json_bytes)
 
+    def precision_agreement(self, texts, dtype='float16'):
+        """Compare predictions at reduced precision to full precision
+
+        Parameters
+        ----------
+        texts : iterable of str
+            Texts on which to compare predictions
+        dtype : Optional[str]
+            Either 'float16' or 'float32'. Precision at which model arrays
+            would be stored. Default: 'float16'
+
+        Returns
+        -------
+        dict
+            Contains the fraction of texts for which the predicted label is
+            the same at both precisions under the key 'agreement' and the
+            largest absolute difference between predicted probabilities under
+            the key 'max_probability_difference'.
+        """
+        texts = list(texts)
+        reduced = load_model_info(self.get_model_info(dtype=dtype))
+        full_probs = self.estimator.predict_proba(texts)
+        reduced_probs = reduced.estimator.predict_proba(texts)
+        agreement = np.mean(full_probs.argmax(axis=1) ==
+                            reduced_probs.argmax(axis=1))
+        difference = np.abs(full_probs - reduced_probs).max()
+        logger.info('Predictions at %s precision agree with full precision'
+                    ' for a fraction %s of texts' % (dtype, agreement))
+        return {'agreement': float(agreement),
+                'max_probability_difference': float(difference)}
+
     def feature_importances(self):
         """Return feature importance scores for each label
 
@@ -445,22 +918,18 @@ class AdeftClassifier(object):
                                   in output[classes[1]][::-1]]
         return output
 
-    def _set_variance(self, texts):
-        """Set attribute containing array of variances for features
+    def _set_variance(self, X, sample_weight=None):
+        """Set attribute containing array of standard deviations for features
 
         Parameters
         __________
-        texts : iterable of str
-            Training texts
+        X : py:class:`scipy.sparse.csr_matrix`
+            tfidf matrix of training texts
+        sample_weight : Optional[py:class:`numpy.ndarray`]
+            Weights of training texts. Default: None
         """
-        tfidf = self.estimator.named_steps['tfidf']
-        X = tfidf.transform(texts)
-        temp = X.copy()
-        temp.data **= 2
-        second_moment = temp.mean(0)
-        first_moment_squared = np.square(X.mean(0))
-        result = second_moment - first_moment_squared
-        self._std = np.sqrt(np.squeeze(np.asarray(result)))
+        _, variance = mean_variance_axis(X, axis=0, weights=sample_weight)
+        self._std = np.sqrt(variance)
 
     def _get_current_time(self):
         unix_timestamp = datetime.now().timestamp()
@@ -471,9 +940,8 @@ class AdeftClassifier(object):
 
         Does not depend on order of texts
         """
-        hashed_texts = ''.join(md5(text.encode('utf-8')).hexdigest()
+        return _combine_hashes(md5(text.encode('utf-8')).hexdigest()
                                for text in sorted(texts))
-        return md5(hashed_texts.encode('utf-8')).hexdigest()
 
 
 def load_model(filepath):
@@ -514,16 +982,23 @@ def load_model_info(model_info):
     longform_model = AdeftClassifier(shortforms=shortforms,
                                      pos_labels=pos_labels)
     ngram_range = model_info['tfidf']['ngram_range']
-    tfidf = TfidfVectorizer(ngram_range=ngram_range,
-                            stop_words='english')
+    # Models stored at reduced precision run inference in float32
+    dtype = np.float32 if 'dtype' in model_info else np.float64
+    if dtype == np.float32:
+        tfidf = _Float32TfidfVectorizer(ngram_range=ngram_range,
+                                        stop_words='english', dtype=dtype)
+    else:
+        tfidf = TfidfVectorizer(ngram_range=ngram_range,
+                                stop_words='english', dtype=dtype)
     logit = LogisticRegression(multi_class='auto')
 
     tfidf.vocabulary_ = model_info['tfidf']['vocabulary_']
-    tfidf.idf_ = model_info['tfidf']['idf_']
+    tfidf.idf_ = np.array(model_info['tfidf']['idf_'], dtype=dtype)
     logit.classes_ = np.array(model_info['logit']['classes_'],
                               dtype='<U64')
-    logit.intercept_ = np.array(model_info['logit']['intercept_'])
-    logit.coef_ = np.array(model_info['logit']['coef_'])
+    logit.intercept_ = np.array(model_info['logit']['intercept_'],
+                                dtype=dtype)
+    logit.coef_ = np.array(model_info['logit']['coef_'], dtype=dtype)
 
     estimator = Pipeline([('tfidf', tfidf),
                           ('logit', logit)])
@@ -533,7 +1008,7 @@ def load_model_info(model_info):
     if 'stats' in model_info:
         longform_model.stats = model_info['stats']
     if 'std' in model_info:
-        longform_model._std = np.array(model_info['std'])
+        longform_model._std = np.array(model_info['std'], dtype=dtype)
     if 'timestamp' in model_info:
         longform_model.timestamp = model_info['timestamp']
     if 'training_set_digest' in model_info:
@@ -549,6 +1024,341 @@ def load_model_info(model_info):
     return longform_model
 
 
-def _count_score(y_true, y_pred, label1=0, label2=1):
-    return sum((y == label1 and pred == label2)
-               for y, pred in zip(y_true, y_pred))
+class _Float32TfidfVectorizer(TfidfVectorizer):
+    """Tfidf vectorizer computing features in float32
+
+    sklearn may apply idf values at float64 precision regardless of the
+    vectorizer's dtype, upcasting the features. Here counts, idf weighting
+    and normalization are computed in float32.
+    """
+    def transform(self, raw_documents):
+        X = CountVectorizer.transform(self, raw_documents)
+        X = X.astype(np.float32, copy=False)
+        if self.sublinear_tf:
+            np.log(X.data, X.data)
+            X.data += 1
+        if self.use_idf:
+            X.data *= self.idf_.astype(np.float32)[X.indices]
+        if self.norm:
+            X = normalize(X, norm=self.norm, copy=False)
+        return X
+
+
+def _array_to_list(array, dtype=None):
+    """Convert array to nested list, optionally rounding to lower precision
+
+    Values are rounded to the given precision and converted to the shortest
+    decimal representation that recovers them exactly, keeping serialized
+    models compact.
+    """
+    if dtype is None:
+        return array.tolist()
+    return array.astype(dtype).astype(str).astype(float).tolist()
+
+
+def _ordered_digest(texts, y, sample_weight=None, groups=None):
+    """Returns a hash of texts and labels depending on their order
+
+    Sample weights and groups are included in the hash when given.
+    """
+    digest = _combine_hashes(md5(('%s\t%s' % (label, text)).encode('utf-8'))
+                             .hexdigest() for text, label in zip(texts, y))
+    if sample_weight is None and groups is None:
+        return digest
+    extra = json.dumps([None if sample_weight is None
+                        else [float(w) for w in sample_weight],
+                        None if groups is None
+                        else [str(group) for group in groups]])
+    return _combine_hashes([digest,
+                            md5(extra.encode('utf-8')).hexdigest()])
+
+
+def _label_totals(y, sample_weight=None):
+    """Return dict mapping labels to the total weight of their examples"""
+    if sample_weight is None:
+        return dict(Counter(y))
+    totals = defaultdict(float)
+    for label, weight in zip(y, sample_weight):
+        totals[label] += weight
+    return dict(totals)
+
+
+def _reservoir_indices(y, max_per_label, random_state=None):
+    """Return sorted indices of a stratified sample capped per label
+
+    A reservoir of at most max_per_label indices is kept for each label while
+    passing once over the labels, so each example of a label has the same
+    chance of being kept.
+    """
+    rng = np.random.RandomState(random_state)
+    reservoirs = defaultdict(list)
+    seen = Counter()
+    for index, label in enumerate(y):
+        seen[label] += 1
+        reservoir = reservoirs[label]
+        if len(reservoir) < max_per_label:
+            reservoir.append(index)
+        else:
+            position = rng.randint(seen[label])
+            if position < max_per_label:
+                reservoir[position] = index
+    return sorted(index for reservoir in reservoirs.values()
+                  for index in reservoir)
+
+
+def _stratified_subsample(y, size, random_state=None):
+    """Return indices of a subsample of about size examples stratified by label
+
+    Labels with a single example cannot be stratified. Their examples are
+    always kept and the rest of the subsample is drawn stratified from the
+    remaining labels.
+    """
+    counts = Counter(y)
+    rare = [index for index, label in enumerate(y) if counts[label] < 2]
+    if not rare:
+        indices, _ = train_test_split(np.arange(len(y)), train_size=size,
+                                      stratify=y, random_state=random_state)
+        return indices
+    common = np.array([index for index, label in enumerate(y)
+                       if counts[label] > 1], dtype=int)
+    num_classes = len(counts) - len(rare)
+    # Every remaining label needs an example on both sides of the split
+    size = min(max(size - len(rare), num_classes),
+               len(common) - num_classes)
+    if size < num_classes:
+        return np.arange(len(y))
+    indices, _ = train_test_split(common, train_size=size,
+                                  stratify=[y[index] for index in common],
+                                  random_state=random_state)
+    return np.concatenate([indices, np.array(rare, dtype=int)])
+
+
+def _weighted_class_weight(class_weight, y, sample_weight=None):
+    """Resolve balanced class weights using weighted label counts
+
+    sklearn computes balanced class weights from unweighted label counts.
+    When training examples are weighted, as for collapsed duplicates or
+    capped labels, the weighted counts are used instead so that each class
+    has the same total weight.
+    """
+    if class_weight != 'balanced' or sample_weight is None:
+        return class_weight
+    totals = _label_totals(y, sample_weight)
+    total = sum(totals.values())
+    return {label: total/(len(totals)*weight)
+            for label, weight in totals.items()}
+
+
+def _as_count(value):
+    """Return weighted count as an int when it is a whole number"""
+    value = float(value)
+    return int(value) if value.is_integer() else value
+
+
+def _matrix_digest(X):
+    """Returns a hash of the rows of a sparse matrix
+
+    Does not depend on the order of the rows
+    """
+    X = X.tocsr()
+    X.sort_indices()
+    hashes = []
+    for i in range(X.shape[0]):
+        start, end = X.indptr[i], X.indptr[i+1]
+        row = X.indices[start:end].tobytes() + X.data[start:end].tobytes()
+        hashes.append(md5(row).hexdigest())
+    return _combine_hashes(sorted(hashes))
+
+
+def _combine_hashes(hashes):
+    """Return md5 hash of the concatenation of an iterable of hex digests"""
+    return md5(''.join(hashes).encode('utf-8')).hexdigest()
+
+
+def _fit_regularization_path(counts, terms, y, split, candidates, labels,
+                             pos_labels, random_state, cache=None,
+                             keys=None, sample_weight=None):
+    """Fit and score a regularization path on one crossvalidation split
+
+    Candidates must share all parameters other than C and be sorted in order
+    of increasing C. Texts are given by their ngram counts, with terms for
+    the columns of counts as returned by
+    :py:meth:`adeft.modeling.ngram_stats.NgramStatistics.count_matrix`. The
+    tfidf vectorizer is fit once for the split to its training texts and each
+    logistic regression fit is warm started from the previous solution. If a
+    cache is given, the scores of each candidate are written to it under the
+    corresponding key as soon as they are computed. Sample weights, if given,
+    are used both for fitting and for scoring.
+
+    Returns
+    -------
+    list of dict
+        Scores on the test set of the split for each candidate, as returned
+        by _confusion_scores.
+    """
+    train, test = split
+    params = dict(_default_cv_params, **candidates[0])
+    tfidf = TfidfVectorizer(ngram_range=params['ngram_range'],
+                            max_features=params['max_features'])
+    counts_train = counts[train]
+    columns = fit_counts(tfidf, counts_train, terms)
+    X_train = transform_counts(tfidf, counts_train, columns)
+    X_test = transform_counts(tfidf, counts[test], columns)
+    y_train = [y[i] for i in train]
+    y_test = [y[i] for i in test]
+    if sample_weight is not None:
+        weight_train, weight_test = sample_weight[train], sample_weight[test]
+    else:
+        weight_train = weight_test = None
+    class_weight = _weighted_class_weight(params['class_weight'], y_train,
+                                          weight_train)
+    logit = LogisticRegression(solver='saga', penalty='l1',
+                               multi_class='auto',
+                               class_weight=class_weight,
+                               random_state=random_state, warm_start=True)
+    result = []
+    for index, candidate in enumerate(candidates):
+        logit.set_params(C=candidate.get('C', _default_cv_params['C']))
+        logit.fit(X_train, y_train, sample_weight=weight_train)
+        scores = _confusion_scores(y_test, logit.predict(X_test), labels,
+                                   pos_labels, weight_test)
+        if cache is not None:
+            cache.put(keys[index], scores)
+        result.append(scores)
+    return result
+
+
+class _GridSearchResults(object):
+    """Crossvalidation results in the format of sklearn's GridSearchCV
+
+    Parameter names are prefixed by the name of the pipeline step they
+    belong to, as they were when cv used GridSearchCV.
+    """
+    param_mapping = {'C': 'logit__C',
+                     'class_weight': 'logit__class_weight',
+                     'max_features': 'tfidf__max_features',
+                     'ngram_range': 'tfidf__ngram_range'}
+
+    def __init__(self, cv_results, best_score, best_estimator):
+        cv_results = dict(cv_results)
+        params = [{self.param_mapping[name]: value
+                   for name, value in candidate.items()}
+                  for candidate in cv_results['params']]
+        for name in sorted(set().union(*params)):
+            values = np.ma.masked_all(len(params), dtype=object)
+            for index, candidate in enumerate(params):
+                if name in candidate:
+                    values[index] = candidate[name]
+            cv_results['param_%s' % name] = values
+        cv_results['params'] = params
+        self.cv_results_ = cv_results
+        self.best_index_ = int(np.argmin(cv_results['rank_test_f1']))
+        self.best_params_ = params[self.best_index_]
+        self.best_score_ = best_score
+        self.best_estimator_ = best_estimator
+        self.n_splits_ = sum(1 for name in cv_results
+                             if name.startswith('split') and
+                             name.endswith('_test_f1'))
+
+
+class _CVCache(object):
+    """On disk cache of crossvalidation scores
+
+    Each entry holds the scores of one candidate on one crossvalidation split
+    and is stored in its own json file, written atomically so that entries
+    remain valid if crossvalidation is interrupted.
+
+    Parameters
+    ----------
+    path : str
+        Directory where entries are stored. Created if it does not exist.
+    """
+    def __init__(self, path):
+        self.path = path
+        if not os.path.exists(path):
+            os.makedirs(path)
+
+    def get(self, key):
+        """Return cached scores for key or None if they are not available"""
+        try:
+            with open(os.path.join(self.path, '%s.json' % key)) as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return None
+
+    def put(self, key, scores):
+        """Store scores under key"""
+        filepath = os.path.join(self.path, '%s.json' % key)
+        temp_filepath = '%s.%s.tmp' % (filepath, uuid.uuid4().hex)
+        with open(temp_filepath, 'w') as f:
+            json.dump({name: float(value) for name, value in scores.items()},
+                      f)
+        os.replace(temp_filepath, filepath)
+
+
+def _precision_recall_f1(tp, fp, fn):
+    """Return precision, recall and f1 score from counts
+
+    Follows the sklearn convention of setting metrics to zero when they are
+    ill-defined.
+    """
+    precision = tp/(tp + fp) if tp + fp else 0.0
+    recall = tp/(tp + fn) if tp + fn else 0.0
+    f1 = 2*tp/(2*tp + fp + fn) if tp else 0.0
+    return precision, recall, f1
+
+
+def _confusion_scores(y_true, y_pred, labels, pos_labels, sample_weight=None):
+    """Compute all crossvalidation metrics from a single confusion matrix
+
+    Parameters
+    ----------
+    y_true : list of str
+        True labels for a test set
+    y_pred : list of str
+        Predicted labels for the test set
+    labels : list of str
+        Sorted list of all labels in the training data
+    pos_labels : list of str
+        Labels for positive classes
+    sample_weight : Optional[py:class:`numpy.ndarray`]
+        Weights of test examples. If None, each example has weight one.
+        Default: None
+
+    Returns
+    -------
+    dict
+        Contains micro averaged f1, precision and recall over positive labels
+        under the keys 'f1', 'pr' and 'rc', per label f1, precision and recall
+        under keys of the form 'f1_<label>', 'rc_<label>' and 'pr_<label>',
+        and the weighted number of test examples with true label label1 and
+        predicted label label2 under keys of the form
+        'count_<label1>_<label2>'.
+    """
+    labels = np.asarray(labels)
+    num_labels = len(labels)
+    true_index = np.searchsorted(labels, y_true)
+    pred_index = np.searchsorted(labels, y_pred)
+    confusion = np.bincount(true_index*num_labels + pred_index,
+                            weights=sample_weight,
+                            minlength=num_labels**2)
+    confusion = confusion.reshape(num_labels, num_labels)
+    tp = np.diag(confusion)
+    fp = confusion.sum(axis=0) - tp
+    fn = confusion.sum(axis=1) - tp
+    pos = np.isin(labels, pos_labels)
+    precision, recall, f1 = _precision_recall_f1(tp[pos].sum(),
+                                                 fp[pos].sum(),
+                                                 fn[pos].sum())
+    result = {'f1': f1, 'pr': precision, 'rc': recall}
+    for i, label in enumerate(labels):
+        precision, recall, f1 = _precision_recall_f1(tp[i], fp[i], fn[i])
+        # Per label precision and recall are stored under each others keys
+        # for consistency with the statistics of previously trained models.
+        result.update({'f1_%s' % label: f1,
+                       'pr_%s' % label: recall,
+                       'rc_%s' % label: precision})
+    for i, label1 in enumerate(labels):
+        for j, label2 in enumerate(labels):
+            result['count_%s_%s' % (label1, label2)] = confusion[i, j]
+    return result
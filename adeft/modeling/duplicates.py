@@ -0,0 +1,132 @@
+"""Collapse duplicate texts in labeled training corpora.
+
+Corpora built by :py:class:`adeft.modeling.label.AdeftLabeler` often contain
+the same text many times, for instance the same abstract taken from several
+sources. Exact duplicates are collapsed into a single weighted sample.
+Near duplicates can optionally be found with MinHash and placed in a common
+group so that crossvalidation never puts them on both sides of a split.
+"""
+import zlib
+import numpy as np
+from collections import defaultdict
+
+from adeft.nlp import word_tokenize
+
+# Mersenne prime 2**31 - 1. Products of 31 bit numbers fit in 64 bits.
+_prime = (1 << 31) - 1
+
+
+def collapse_duplicates(texts, y, near_duplicates=False, threshold=0.8,
+                        num_perm=128, shingle_size=3, random_state=0):
+    """Collapse duplicate training examples into weighted samples
+
+    Parameters
+    ----------
+    texts : iterable of str
+        Training texts
+    y : iterable of str
+        Labels for training texts
+    near_duplicates : Optional[bool]
+        If True, texts whose estimated Jaccard similarity of word shingles is
+        at least threshold are placed in the same group. If False, only
+        identical texts share a group. Default: False
+    threshold : Optional[float]
+        Jaccard similarity above which texts are considered near duplicates.
+        Default: 0.8
+    num_perm : Optional[int]
+        Number of hash functions used for MinHash signatures. Default: 128
+    shingle_size : Optional[int]
+        Number of consecutive words in each shingle. Default: 3
+    random_state : Optional[int]
+        Seed for generating MinHash hash functions. Default: 0
+
+    Returns
+    -------
+    texts : list of str
+        Training texts with duplicate (text, label) pairs removed. Order of
+        first appearance is preserved.
+    y : list of str
+        Labels for the collapsed training texts
+    sample_weight : py:class:`numpy.ndarray`
+        Number of times each (text, label) pair appeared in the input.
+    groups : py:class:`numpy.ndarray`
+        Integer group for each collapsed training text. Identical texts with
+        different labels, and near duplicates if requested, share a group.
+        Suitable for the groups argument of
+        :py:meth:`adeft.modeling.classify.AdeftClassifier.cv`.
+    """
+    counts = {}
+    for text, label in zip(texts, y):
+        counts[text, label] = counts.get((text, label), 0) + 1
+    out_texts = [text for text, _ in counts]
+    out_y = [label for _, label in counts]
+    sample_weight = np.array(list(counts.values()), dtype=float)
+    text_ids = {}
+    for text in out_texts:
+        text_ids.setdefault(text, len(text_ids))
+    groups = np.array([text_ids[text] for text in out_texts])
+    if near_duplicates and len(text_ids) > 1:
+        unique_texts = list(text_ids)
+        signatures = _minhash_signatures(unique_texts, num_perm,
+                                         shingle_size, random_state)
+        clusters = _near_duplicate_clusters(signatures, threshold)
+        groups = clusters[groups]
+    return out_texts, out_y, sample_weight, groups
+
+
+def _minhash_signatures(texts, num_perm, shingle_size, random_state):
+    """Return MinHash signatures of the word shingles of each text"""
+    rng = np.random.RandomState(random_state)
+    a = rng.randint(1, _prime, size=num_perm).astype(np.uint64)
+    b = rng.randint(0, _prime, size=num_perm).astype(np.uint64)
+    signatures = np.empty((len(texts), num_perm), dtype=np.uint64)
+    for i, text in enumerate(texts):
+        tokens = [token for token, _ in word_tokenize(text.lower())]
+        shingles = {' '.join(tokens[j:j+shingle_size])
+                    for j in range(max(1, len(tokens) - shingle_size + 1))}
+        hashes = np.array([zlib.crc32(shingle.encode('utf-8')) % _prime
+                           for shingle in shingles], dtype=np.uint64)
+        signatures[i] = ((np.outer(hashes, a) + b) % _prime).min(axis=0)
+    return signatures
+
+
+def _near_duplicate_clusters(signatures, threshold):
+    """Cluster texts with similar MinHash signatures
+
+    Candidate pairs are found with locality sensitive hashing over bands of
+    the signatures and kept if their estimated Jaccard similarity is at least
+    threshold. Returns a cluster label for each row of signatures given by
+    the connected components of the resulting graph.
+    """
+    num_texts, num_perm = signatures.shape
+    # Choose the number of bands so that the LSH similarity threshold
+    # (1/bands)**(1/rows) is as close as possible to the given threshold
+    num_bands = min((bands for bands in range(1, num_perm + 1)
+                     if num_perm % bands == 0),
+                    key=lambda bands: abs((1/bands)**(bands/num_perm) -
+                                          threshold))
+    rows = num_perm // num_bands
+    parent = list(range(num_texts))
+
+    def find(i):
+        while parent[i] != i:
+            parent[i] = parent[parent[i]]
+            i = parent[i]
+        return i
+    for band in range(num_bands):
+        buckets = defaultdict(list)
+        band_signatures = signatures[:, band*rows:(band+1)*rows]
+        for i in range(num_texts):
+            buckets[band_signatures[i].tobytes()].append(i)
+        for bucket in buckets.values():
+            first = bucket[0]
+            for other in bucket[1:]:
+                root1, root2 = find(first), find(other)
+                if root1 == root2:
+                    continue
+                similarity = np.mean(signatures[first] == signatures[other])
+                if similarity >= threshold:
+                    parent[root2] = root1
+    roots = [find(i) for i in range(num_texts)]
+    labels = {}
+    return np.array([labels.setdefault(root, len(labels)) for root in roots])
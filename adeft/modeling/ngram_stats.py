@@ -0,0 +1,365 @@
+"""Incrementally maintained ngram and document frequency statistics.
+
+Fitting a tfidf vectorizer requires counting the ngrams of every training
+text. When models are refit on a growing corpus, these counts can instead be
+kept in a :py:class:`NgramStatistics` store, updated with only the texts that
+have not been seen before. The ngram counts of each text are kept, so that
+:py:meth:`adeft.modeling.classify.AdeftClassifier.train` and
+:py:meth:`adeft.modeling.classify.AdeftClassifier.cv` can assemble the tfidf
+features of any set of counted texts, including those of each
+crossvalidation split, without tokenizing them again. Features are the same
+as those computed by sklearn's TfidfVectorizer from the texts themselves.
+"""
+import gzip
+import json
+import logging
+import numpy as np
+from hashlib import md5
+from collections import Counter
+from scipy.sparse import csr_matrix
+
+from sklearn.preprocessing import normalize
+from sklearn.feature_extraction.text import TfidfVectorizer
+
+logger = logging.getLogger(__file__)
+
+
+class NgramStatistics(object):
+    """Mergeable store of ngram counts keyed by text digest
+
+    Each text is identified by the md5 hash of its contents and counted at
+    most once, so updating the store with a corpus only requires tokenizing
+    texts that were not already added. The ngram counts of each text are
+    kept so that count matrices can be assembled for any counted texts.
+
+    Parameters
+    ----------
+    ngram_range : Optional[tuple of int]
+        Range of ngrams to count. Vectorizers for any ngram range contained
+        in this one can be produced from the store. Default: (1, 2)
+    stop_words : Optional[iterable of str]
+        Stopwords excluded from ngrams. Must match the stop attribute of the
+        :py:class:`adeft.modeling.classify.AdeftClassifier` the statistics
+        are used with. Default: None
+
+    Attributes
+    ----------
+    num_texts : int
+        Number of distinct texts that have been counted
+    term_counts : py:class:`collections.Counter`
+        Total number of occurences of each ngram
+    document_counts : py:class:`collections.Counter`
+        Number of texts containing each ngram
+    terms : list of str
+        Counted ngrams, indexed by term id
+    rows : dict
+        Maps the md5 hash of each counted text to a pair of arrays holding
+        the ids and the counts of the ngrams it contains
+    """
+    def __init__(self, ngram_range=(1, 2), stop_words=None):
+        self.ngram_range = tuple(ngram_range)
+        self.stop_words = sorted(stop_words) if stop_words is not None \
+            else None
+        self.num_texts = 0
+        self.term_counts = Counter()
+        self.document_counts = Counter()
+        self.terms = []
+        self.rows = {}
+        self._term_ids = {}
+
+    @property
+    def digests(self):
+        """set of str: md5 hashes of counted texts"""
+        return set(self.rows)
+
+    def update(self, texts):
+        """Count ngrams for texts not already in the store
+
+        Parameters
+        ----------
+        texts : iterable of str
+            Texts to add. Texts that have already been counted are skipped.
+
+        Returns
+        -------
+        int
+            Number of new texts that were counted
+        """
+        analyzer = TfidfVectorizer(ngram_range=self.ngram_range,
+                                   stop_words=self.stop_words).\
+            build_analyzer()
+        num_new = 0
+        for text in texts:
+            digest = md5(text.encode('utf-8')).hexdigest()
+            if digest in self.rows:
+                continue
+            counts = Counter(analyzer(text))
+            self.rows[digest] = (self._get_term_ids(counts),
+                                 np.fromiter(counts.values(), dtype=np.int32,
+                                             count=len(counts)))
+            self.term_counts.update(counts)
+            self.document_counts.update(counts.keys())
+            num_new += 1
+        self.num_texts += num_new
+        logger.info('Counted ngrams for %s new texts' % num_new)
+        return num_new
+
+    def merge(self, other):
+        """Add the statistics of another store counted over distinct texts
+
+        Parameters
+        ----------
+        other : :py:class:`NgramStatistics`
+            Statistics with the same ngram_range and stop_words, computed
+            for texts disjoint from those in this store.
+        """
+        if other.ngram_range != self.ngram_range or \
+           other.stop_words != self.stop_words:
+            raise ValueError('Cannot merge statistics with different'
+                             ' ngram_range or stop_words')
+        overlap = self.rows.keys() & other.rows.keys()
+        if overlap:
+            raise ValueError('Cannot merge statistics sharing %s texts'
+                             % len(overlap))
+        term_ids = self._get_term_ids(other.terms)
+        for digest, (ids, counts) in other.rows.items():
+            self.rows[digest] = (term_ids[ids], counts)
+        self.term_counts.update(other.term_counts)
+        self.document_counts.update(other.document_counts)
+        self.num_texts += other.num_texts
+
+    def fit_vectorizer(self, tfidf):
+        """Set the vocabulary and idf values of a tfidf vectorizer
+
+        Features are chosen as by
+        :py:meth:`sklearn.feature_extraction.text.TfidfVectorizer.fit`, by
+        selecting the max_features ngrams with the highest total counts,
+        except that counts are taken over all texts in the store.
+
+        Parameters
+        ----------
+        tfidf : :py:class:`sklearn.feature_extraction.text.TfidfVectorizer`
+            Vectorizer with the default analyzer and smooth_idf. Its
+            ngram_range must lie within that of the store and its stop words
+            must match. It can be used for transforming texts afterwards.
+        """
+        self.check_vectorizer(tfidf)
+        min_n, max_n = tfidf.ngram_range
+        terms = sorted(term for term in self.term_counts
+                       if min_n <= term.count(' ') + 1 <= max_n)
+        if tfidf.max_features is not None and \
+           len(terms) > tfidf.max_features:
+            totals = np.array([self.term_counts[term] for term in terms],
+                              dtype=float)
+            kept = np.sort((-totals).argsort()[:tfidf.max_features])
+            terms = [terms[index] for index in kept]
+        document_counts = np.array([self.document_counts[term]
+                                    for term in terms], dtype=float)
+        tfidf.vocabulary_ = {term: index for index, term in enumerate(terms)}
+        tfidf.idf_ = np.log((1 + self.num_texts)/(1 + document_counts)) + 1
+
+    def fit_transform(self, tfidf, texts):
+        """Fit a tfidf vectorizer to counted texts and return their features
+
+        Equivalent to calling the fit_transform method of the vectorizer on
+        the texts, but uses the stored ngram counts instead of tokenizing
+        them.
+
+        Parameters
+        ----------
+        tfidf : :py:class:`sklearn.feature_extraction.text.TfidfVectorizer`
+            Vectorizer as in :py:meth:`fit_vectorizer`
+        texts : iterable of str
+            Texts that have been counted in the store
+
+        Returns
+        -------
+        py:class:`scipy.sparse.csr_matrix`
+            Tfidf features of the texts
+        """
+        self.check_vectorizer(tfidf)
+        counts, terms = self.count_matrix(texts)
+        columns = fit_counts(tfidf, counts, terms)
+        return transform_counts(tfidf, counts, columns)
+
+    def count_matrix(self, texts):
+        """Return the ngram counts of counted texts
+
+        Parameters
+        ----------
+        texts : iterable of str
+            Texts that have been counted in the store
+
+        Returns
+        -------
+        counts : py:class:`scipy.sparse.csr_matrix`
+            Matrix with a row of ngram counts for each text and a column for
+            each term in the store, in alphabetical order.
+        terms : list of str
+            Term for each column of counts
+        """
+        order = sorted(range(len(self.terms)), key=self.terms.__getitem__)
+        ranks = np.empty(len(order), dtype=np.int32)
+        ranks[order] = np.arange(len(order), dtype=np.int32)
+        indices = [np.zeros(0, dtype=np.int32)]
+        data = [np.zeros(0, dtype=np.int32)]
+        indptr = [0]
+        for text in texts:
+            digest = md5(text.encode('utf-8')).hexdigest()
+            try:
+                ids, counts = self.rows[digest]
+            except KeyError:
+                raise ValueError('Text with digest %s has not been counted'
+                                 % digest)
+            indices.append(ranks[ids])
+            data.append(counts)
+            indptr.append(indptr[-1] + len(ids))
+        counts = csr_matrix((np.concatenate(data).astype(np.float64),
+                             np.concatenate(indices), indptr),
+                            shape=(len(indptr) - 1, len(order)))
+        counts.sort_indices()
+        return counts, [self.terms[index] for index in order]
+
+    def check_vectorizer(self, tfidf):
+        """Raise ValueError if a vectorizer cannot be fit from the store
+
+        Parameters
+        ----------
+        tfidf : :py:class:`sklearn.feature_extraction.text.TfidfVectorizer`
+            Vectorizer whose ngram_range must lie within that of the store
+            and whose stop words must match those of the store
+        """
+        min_n, max_n = tfidf.ngram_range
+        if min_n < self.ngram_range[0] or max_n > self.ngram_range[1]:
+            raise ValueError('ngram_range %s is not contained in the ngram'
+                             ' range %s of the statistics'
+                             % (tfidf.ngram_range, self.ngram_range))
+        stop_words = sorted(tfidf.stop_words) if tfidf.stop_words \
+            is not None else None
+        if stop_words != self.stop_words:
+            raise ValueError('Vectorizer and statistics use different'
+                             ' stop words')
+
+    def _get_term_ids(self, terms):
+        """Return array of term ids, adding terms not yet in the store"""
+        ids = np.empty(len(terms), dtype=np.int32)
+        for index, term in enumerate(terms):
+            term_id = self._term_ids.get(term)
+            if term_id is None:
+                term_id = self._term_ids[term] = len(self.terms)
+                self.terms.append(term)
+            ids[index] = term_id
+        return ids
+
+    def dump(self, filepath):
+        """Serialize statistics to gzipped json
+
+        Parameters
+        ----------
+        filepath : str
+            Path to output file
+        """
+        stats_info = {'ngram_range': self.ngram_range,
+                      'stop_words': self.stop_words,
+                      'num_texts': self.num_texts,
+                      'term_counts': self.term_counts,
+                      'document_counts': self.document_counts,
+                      'terms': self.terms,
+                      'rows': {digest: [ids.tolist(), counts.tolist()]
+                               for digest, (ids, counts)
+                               in self.rows.items()}}
+        json_bytes = json.dumps(stats_info).encode('utf-8')
+        with gzip.GzipFile(filepath, 'w') as fout:
+            fout.write(json_bytes)
+
+
+def load_ngram_statistics(filepath):
+    """Load previously serialized ngram statistics
+
+    Parameters
+    ----------
+    filepath : str
+        Path to file created by :py:meth:`NgramStatistics.dump`
+
+    Returns
+    -------
+    :py:class:`NgramStatistics`
+    """
+    with gzip.GzipFile(filepath, 'r') as fin:
+        stats_info = json.loads(fin.read().decode('utf-8'))
+    stats = NgramStatistics(ngram_range=stats_info['ngram_range'],
+                            stop_words=stats_info['stop_words'])
+    stats.num_texts = stats_info['num_texts']
+    stats.term_counts = Counter(stats_info['term_counts'])
+    stats.document_counts = Counter(stats_info['document_counts'])
+    stats.terms = stats_info['terms']
+    stats._term_ids = {term: index for index, term in enumerate(stats.terms)}
+    stats.rows = {digest: (np.array(ids, dtype=np.int32),
+                           np.array(counts, dtype=np.int32))
+                  for digest, (ids, counts) in stats_info['rows'].items()}
+    return stats
+
+
+def fit_counts(tfidf, counts, terms):
+    """Fit a tfidf vectorizer to texts given by their ngram counts
+
+    The vocabulary and idf values are those that
+    :py:meth:`sklearn.feature_extraction.text.TfidfVectorizer.fit` produces
+    for the texts, including the order in which ngrams with equal total
+    counts are selected when max_features is set.
+
+    Parameters
+    ----------
+    tfidf : :py:class:`sklearn.feature_extraction.text.TfidfVectorizer`
+        Vectorizer with the default analyzer and smooth_idf
+    counts : py:class:`scipy.sparse.csr_matrix`
+        Ngram counts of the texts as returned by
+        :py:meth:`NgramStatistics.count_matrix`
+    terms : list of str
+        Term for each column of counts, in alphabetical order
+
+    Returns
+    -------
+    columns : py:class:`numpy.ndarray`
+        Columns of counts for the terms in the vocabulary, in order
+    """
+    min_n, max_n = tfidf.ngram_range
+    lengths = np.fromiter((term.count(' ') + 1 for term in terms),
+                          dtype=int, count=len(terms))
+    document_counts = np.bincount(counts.indices, minlength=len(terms))
+    columns = np.flatnonzero((lengths >= min_n) & (lengths <= max_n) &
+                             (document_counts > 0))
+    if tfidf.max_features is not None and \
+       len(columns) > tfidf.max_features:
+        totals = np.asarray(counts[:, columns].sum(axis=0)).ravel()
+        columns = np.sort(columns[(-totals).argsort()
+                                  [:tfidf.max_features]])
+    tfidf.vocabulary_ = {terms[column]: index
+                         for index, column in enumerate(columns)}
+    document_counts = document_counts[columns].astype(np.float64)
+    tfidf.idf_ = np.log((counts.shape[0] + 1)/(document_counts + 1)) + 1
+    return columns
+
+
+def transform_counts(tfidf, counts, columns):
+    """Return tfidf features of texts given by their ngram counts
+
+    Parameters
+    ----------
+    tfidf : :py:class:`sklearn.feature_extraction.text.TfidfVectorizer`
+        Vectorizer fit with :py:func:`fit_counts`
+    counts : py:class:`scipy.sparse.csr_matrix`
+        Ngram counts of the texts with the same columns as those the
+        vectorizer was fit to
+    columns : py:class:`numpy.ndarray`
+        Columns returned by :py:func:`fit_counts`
+
+    Returns
+    -------
+    py:class:`scipy.sparse.csr_matrix`
+        Tfidf features of the texts, as returned by the transform method of
+        the vectorizer
+    """
+    X = counts[:, columns]
+    X.data *= tfidf.idf_[X.indices]
+    return normalize(X, norm=tfidf.norm, copy=False)
@@ -44,6 +44,11 @@ class WatchfulStemmer(object):
     counts : Optional[dict]
         counts dictionary as used internally in WatchfulStemmer. Allows for
         loading a previously saved WatchfulStemmer
+    cache : Optional[dict]
+        Dictionary mapping words to their stems. Words found in the cache are
+        not stemmed again. The same dictionary can be shared by several
+        stemmers that keep separate counts. If None, no cache is used.
+        Default: None
 
     Attributes
     ----------
@@ -53,31 +58,44 @@ class WatchfulStemmer(object):
         Contains the count of the number of times a particular word has been
         mapped to from a particular stem by the wrapped stemmer. Of the form
         counts[stem:str][word:str] = count:int
+
+    cache : dict or None
+        Cache of previously computed stems
     """
-    def __init__(self, counts=None):
+    def __init__(self, counts=None, cache=None):
         if counts is None:
             counts = {}
-        self.counts = defaultdict(lambda: defaultdict(int),
+        # A module level factory is used so that stemmers can be pickled
+        self.counts = defaultdict(_word_counts,
                                   {key: defaultdict(int, value)
                                    for key, value in counts.items()})
+        self.cache = cache
 
-    def stem(self, word):
+    def stem(self, word, count=1):
         """Returns stemmed form of word.
 
-        Adds one to count associated to the computed stem, word pair.
+        Adds count to count associated to the computed stem, word pair.
 
         Parameters
         ----------
         word : str
             text to stem
 
+        count : Optional[int]
+            Number of times word has been observed. Default: 1
+
         Returns
         -------
         stemmed : str
             stemmed form of input word
         """
-        stemmed = stem(word)
-        self.counts[stemmed][word.lower()] += 1
+        if self.cache is None:
+            stemmed = stem(word)
+        else:
+            stemmed = self.cache.get(word)
+            if stemmed is None:
+                stemmed = self.cache[word] = stem(word)
+        self.counts[stemmed][word.lower()] += count
         return stemmed
 
     def most_frequent(self, stemmed):
@@ -105,11 +123,27 @@ class WatchfulStemmer(object):
             raise ValueError('stem %s has not been observed' % stemmed)
         return output
 
+    def update(self, other):
+        """Add the word counts of another stemmer to this one
+
+        Parameters
+        ----------
+        other : :py:class:`adeft.nlp.nlp.WatchfulStemmer`
+        """
+        for stemmed, words in other.counts.items():
+            current = self.counts[stemmed]
+            for word, count in words.items():
+                current[word] += count
+
     def dump(self):
         """Returns dictionary of info needed to reconstruct stemmer"""
         return dict(self.counts)
 
 
+def _word_counts():
+    return defaultdict(int)
+
+
 def word_tokenize(text):
     """Simple word tokenizer based on a regular expression pattern
 
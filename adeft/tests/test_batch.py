@@ -0,0 +1,68 @@
+import os
+import uuid
+import shutil
+
+from adeft.locations import TEST_RESOURCES_PATH
+from adeft.disambiguate import load_disambiguator
+from adeft.modeling.batch import train_disambiguators
+
+# Path to scratch directory to write files to during tests
+SCRATCH_PATH = os.path.join(TEST_RESOURCES_PATH, 'scratch')
+
+
+ir_texts = [('The insulin receptor (IR) is activated by insulin and IGF'
+             ' signaling through tyrosine kinase activity.', 'ir_a'),
+            ('Ionizing radiation (IR) causes DNA damage depending on'
+             ' radiation dose.', 'ir_b')]
+
+er_texts = [('The estrogen receptor (ER) binds estradiol in breast'
+             ' cancer cells.', 'er_a'),
+            ('The endoplasmic reticulum (ER) is the site of protein folding'
+             ' and stress.', 'er_b')]
+
+
+def _make_corpus(examples):
+    return [('%s %s' % (text, i), '%s_%s' % (identifier, i))
+            for i in range(10) for text, identifier in examples]
+
+
+manifest = [{'model_name': 'IR',
+             'grounding_dict': {'IR': {'insulin receptor': 'HGNC:6091',
+                                       'ionizing radiation':
+                                       'MESH:D011839'}},
+             'names': {'HGNC:6091': 'INSR',
+                       'MESH:D011839': 'Radiation, Ionizing'},
+             'pos_labels': ['HGNC:6091', 'MESH:D011839'],
+             'corpus': _make_corpus(ir_texts)},
+            {'model_name': 'ER',
+             'grounding_dict': {'ER': {'estrogen receptor': 'FPLX:ESR',
+                                       'endoplasmic reticulum':
+                                       'GO:GO:0005783'}},
+             'names': {'FPLX:ESR': 'ESR',
+                       'GO:GO:0005783': 'endoplasmic reticulum'},
+             'pos_labels': ['FPLX:ESR'],
+             'corpus': _make_corpus(er_texts)}]
+
+
+def test_train_disambiguators():
+    output_path = os.path.join(SCRATCH_PATH, uuid.uuid4().hex)
+    try:
+        status = train_disambiguators(manifest, output_path, n_jobs=2,
+                                      param_grid={'C': [10.0],
+                                                  'max_features': [10]},
+                                      cv=2, random_state=1729)
+        assert status == {'IR': 'trained', 'ER': 'trained'}
+        ad = load_disambiguator('IR', path=output_path)
+        assert ad.disambiguate('insulin receptor tyrosine kinase IR')[0] \
+            == 'HGNC:6091'
+        assert not [filename for filename in os.listdir(output_path)
+                    if filename.endswith('.tmp')]
+        # Completed models are skipped when a run is resumed
+        shutil.rmtree(os.path.join(output_path, 'ER'))
+        status = train_disambiguators(manifest, output_path, n_jobs=2,
+                                      param_grid={'C': [10.0],
+                                                  'max_features': [10]},
+                                      cv=2, random_state=1729)
+        assert status == {'IR': 'skipped', 'ER': 'trained'}
+    finally:
+        shutil.rmtree(output_path, ignore_errors=True)
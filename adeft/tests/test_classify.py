@@ -1,12 +1,19 @@
 import os
 import uuid
 import json
+import shutil
+import warnings
 import numpy as np
+from collections import Counter
+from nose.tools import assert_raises
 from nose.plugins.attrib import attr
 from sklearn.metrics import f1_score
+from sklearn.feature_extraction.text import CountVectorizer
 
 from adeft.locations import TEST_RESOURCES_PATH
-from adeft.modeling.classify import AdeftClassifier, load_model
+from adeft.modeling.classify import AdeftClassifier, load_model, \
+    load_model_info, _confusion_scores, _reservoir_indices
+from adeft.modeling.duplicates import collapse_duplicates
 
 
 # Get test model path so we can write a temporary file here
@@ -89,6 +96,209 @@ def test_cv_binary():
             if feature == 'group'][0] < 0
 
 
+@attr('slow')
+def test_cv_regularization_path():
+    params = {'C': [10.0, 0.1, 1.0],
+              'max_features': [10, 20]}
+    texts = data['texts']
+    labels = data['labels']
+    classifier = AdeftClassifier('IR', ['HGNC:6091', 'MESH:D011839'],
+                                 random_state=1729)
+    classifier.cv(texts, labels, param_grid=params, cv=2)
+    cv_results = classifier.cv_results
+    assert len(cv_results['params']) == 6
+    assert len(cv_results['mean_test_f1']) == 6
+    assert classifier.params['C'] in params['C']
+    assert classifier.params['max_features'] in params['max_features']
+    # The deprecated grid_search attribute keeps its former structure
+    with warnings.catch_warnings(record=True) as caught:
+        warnings.simplefilter('always')
+        grid_search = classifier.grid_search
+    assert caught[0].category is DeprecationWarning
+    assert grid_search.best_score_ == classifier.best_score
+    assert grid_search.best_params_ == \
+        {'logit__C': classifier.params['C'],
+         'tfidf__max_features': classifier.params['max_features']}
+    assert list(grid_search.cv_results_['param_logit__C']) == \
+        [params['logit__C'] for params in grid_search.cv_results_['params']]
+    assert grid_search.n_splits_ == 2
+    # Results should not depend on how fits are distributed over processes
+    stats1 = classifier.stats
+    classifier.cv(texts, labels, param_grid=params, cv=2, n_jobs=2)
+    assert classifier.stats == stats1
+
+
+@attr('slow')
+def test_cv_halving():
+    params = {'C': [0.1, 1.0, 10.0],
+              'max_features': [5, 10, 20]}
+    texts = data['texts']
+    labels = data['labels']
+    classifier = AdeftClassifier('IR', ['HGNC:6091', 'MESH:D011839'],
+                                 random_state=1729)
+    classifier.cv(texts, labels, param_grid=params, cv=2, search='halving')
+    # Only the best third of the candidates reach the final round
+    assert len(classifier.cv_results['params']) == 3
+    assert classifier.params['C'] in params['C']
+    assert classifier.params['max_features'] in params['max_features']
+    assert classifier.stats['f1']['mean'] > 0.5
+    assert set(classifier.stats) == set(labels) | {'label_distribution',
+                                                   'f1', 'precision',
+                                                   'recall'}
+    assert len(classifier.confusion_info['HGNC:6091']['HGNC:6091']) == 2
+
+
+@attr('slow')
+def test_cv_halving_singleton_label():
+    params = {'C': [0.1, 1.0, 10.0],
+              'max_features': [5, 10, 20]}
+    texts = data['texts']
+    labels = list(data['labels'])
+    # Labels with a single example cannot be stratified but are kept
+    labels[0] = 'singleton'
+    classifier = AdeftClassifier('IR', ['HGNC:6091', 'MESH:D011839'],
+                                 random_state=1729)
+    classifier.cv(texts, labels, param_grid=params, cv=2, search='halving')
+    assert len(classifier.cv_results['params']) == 3
+    assert classifier.stats['label_distribution']['singleton'] == 1
+
+
+def test_cv_halving_factor():
+    classifier = AdeftClassifier('IR', ['HGNC:6091', 'MESH:D011839'],
+                                 random_state=1729)
+    for halving_factor in [0, 1, 1.5, 3.0]:
+        with assert_raises(ValueError):
+            classifier.cv(data['texts'], data['labels'],
+                          param_grid={'C': [1.0, 10.0]}, cv=2,
+                          search='halving', halving_factor=halving_factor)
+
+
+@attr('slow')
+def test_cv_cache():
+    texts = data['texts']
+    labels = data['labels']
+    cache_path = os.path.join(SCRATCH_PATH, uuid.uuid4().hex)
+    classifier = AdeftClassifier('IR', ['HGNC:6091', 'MESH:D011839'],
+                                 random_state=1729)
+    try:
+        classifier.cv(texts, labels, param_grid={'C': [1.0]}, cv=2,
+                      cache_path=cache_path)
+        stats1 = classifier.stats
+        cache_dir = os.path.join(cache_path, classifier.training_set_digest)
+        assert len(os.listdir(cache_dir)) == 2
+        # Rerunning with an extra grid value only adds the new fits
+        classifier.cv(texts, labels, param_grid={'C': [1.0, 10.0]}, cv=2,
+                      cache_path=cache_path)
+        assert len(os.listdir(cache_dir)) == 4
+        cv_results = classifier.cv_results
+        index = [params['C'] for params in cv_results['params']].index(1.0)
+        assert np.round(cv_results['mean_test_f1'][index], 6) == \
+            stats1['f1']['mean']
+    finally:
+        shutil.rmtree(cache_path, ignore_errors=True)
+
+
+@attr('slow')
+def test_cv_cache_regularization_path():
+    texts = data['texts']
+    labels = data['labels']
+    params = {'C': [0.01, 0.1, 1.0, 10.0, 100.0]}
+    cache_path = os.path.join(SCRATCH_PATH, uuid.uuid4().hex)
+    classifier = AdeftClassifier('IR', ['HGNC:6091', 'MESH:D011839'],
+                                 random_state=1729)
+    try:
+        classifier.cv(texts, labels, param_grid={'C': [10.0, 100.0]}, cv=2,
+                      cache_path=cache_path)
+        # Fits are warm started along the path, so adding smaller values of
+        # C must give the same results as a run without the cache
+        classifier.cv(texts, labels, param_grid=params, cv=2,
+                      cache_path=cache_path)
+        cached_results = classifier.cv_results
+        classifier.cv(texts, labels, param_grid=params, cv=2)
+        fresh_results = classifier.cv_results
+        assert np.array_equal(cached_results['mean_test_f1'],
+                              fresh_results['mean_test_f1'])
+        # A rerun reuses the cached scores for the whole grid
+        classifier.cv(texts, labels, param_grid=params, cv=2,
+                      cache_path=cache_path)
+        assert np.array_equal(classifier.cv_results['mean_test_f1'],
+                              fresh_results['mean_test_f1'])
+    finally:
+        shutil.rmtree(cache_path, ignore_errors=True)
+
+
+@attr('slow')
+def test_cv_duplicates():
+    texts = data['texts']
+    labels = data['labels']
+    texts, labels, sample_weight, groups = \
+        collapse_duplicates(texts + texts[:20], labels + labels[:20])
+    classifier = AdeftClassifier('IR', ['HGNC:6091', 'MESH:D011839'],
+                                 random_state=1729)
+    classifier.cv(texts, labels, param_grid={'C': [1.0]}, cv=2,
+                  sample_weight=sample_weight, groups=groups)
+    distribution = classifier.stats['label_distribution']
+    assert sum(distribution.values()) == len(data['texts']) + 20
+    total = sum(classifier.confusion_info[label1][label2][i]
+                for label1 in distribution for label2 in distribution
+                for i in range(2))
+    assert total == len(data['texts']) + 20
+
+
+@attr('slow')
+def test_cv_max_per_label():
+    texts = data['texts']
+    labels = data['labels']
+    classifier = AdeftClassifier('IR', ['HGNC:6091', 'MESH:D011839'],
+                                 random_state=1729)
+    classifier.cv(texts, labels, param_grid={'C': [1.0]}, cv=2,
+                  max_per_label=20)
+    # The true label distribution is recorded
+    distribution = classifier.stats['label_distribution']
+    assert distribution == dict(Counter(labels))
+    total = sum(classifier.confusion_info[label1][label2][i]
+                for label1 in distribution for label2 in distribution
+                for i in range(2))
+    assert np.isclose(total, len(texts))
+
+
+def test_reservoir_indices():
+    y = ['a']*100 + ['b']*10 + ['c']*30
+    indices = _reservoir_indices(y, 20, random_state=0)
+    assert indices == sorted(set(indices))
+    assert Counter(y[i] for i in indices) == {'a': 20, 'b': 10, 'c': 20}
+    assert indices == _reservoir_indices(y, 20, random_state=0)
+    assert indices != _reservoir_indices(y, 20, random_state=1)
+
+
+def test_train_from_features():
+    texts = data['texts']
+    labels = data['labels']
+    classifier = AdeftClassifier('IR', ['HGNC:6091', 'MESH:D011839'],
+                                 random_state=1729)
+    counts = CountVectorizer(ngram_range=(1, 2), max_features=100,
+                             stop_words=classifier.stop)
+    X = counts.fit_transform(texts)
+    classifier.train_from_features(X, counts.get_feature_names(), labels,
+                                   C=10.0)
+    assert classifier.params['ngram_grange'] == (1, 2)
+    # Parameters are recorded in the same format as by train
+    trained = AdeftClassifier('IR', ['HGNC:6091', 'MESH:D011839'])
+    trained.train(texts, labels, max_features=10)
+    assert set(classifier.params) == set(trained.params)
+    # The model applies to raw texts and survives serialization
+    preds = classifier.predict(texts)
+    assert (f1_score(labels, preds, labels=['HGNC:6091', 'MESH:D011839'],
+                     average='weighted') > 0.5)
+    loaded = load_model_info(classifier.get_model_info())
+    assert np.array_equal(loaded.predict(texts), preds)
+    # Same model as training from texts with the same vocabulary
+    classifier2 = AdeftClassifier('IR', ['HGNC:6091', 'MESH:D011839'],
+                                  random_state=1729)
+    classifier2.train(texts, labels, C=10.0, max_features=100)
+    assert np.array_equal(classifier2.predict(texts), preds)
+
+
 def test_training_set_digest():
     classifier = AdeftClassifier('?', ['??', '???'])
     texts = data['texts']
@@ -99,6 +309,33 @@ def test_training_set_digest():
     assert digest1 != digest3
 
 
+def test_confusion_scores():
+    y_true = ['A', 'A', 'A', 'B', 'B', 'C', 'C', 'C']
+    y_pred = ['A', 'A', 'B', 'B', 'C', 'C', 'A', 'C']
+    scores = _confusion_scores(y_true, y_pred, ['A', 'B', 'C'], ['A', 'B'])
+    assert scores['count_A_A'] == 2
+    assert scores['count_A_B'] == 1
+    assert scores['count_C_A'] == 1
+    assert scores['count_B_A'] == 0
+    for label in ['A', 'B', 'C']:
+        assert np.isclose(scores['f1_%s' % label],
+                          f1_score(y_true, y_pred, labels=[label],
+                                   average=None)[0])
+    assert np.isclose(scores['f1'], f1_score(y_true, y_pred,
+                                             labels=['A', 'B'],
+                                             average='micro'))
+    # Weighted counts are the same as repeating examples
+    weights = np.array([2, 1, 1, 1, 1, 1, 3, 1])
+    weighted_scores = _confusion_scores(y_true, y_pred, ['A', 'B', 'C'],
+                                        ['A', 'B'], weights)
+    assert weighted_scores['count_A_A'] == 3
+    assert weighted_scores['count_C_A'] == 3
+    repeated = _confusion_scores(np.repeat(y_true, weights),
+                                 np.repeat(y_pred, weights),
+                                 ['A', 'B', 'C'], ['A', 'B'])
+    assert np.isclose(weighted_scores['f1'], repeated['f1'])
+
+
 def test_serialize():
     """Test that models can correctly be saved to and loaded from gzipped json
     """
@@ -145,3 +382,29 @@ def test_serialize():
     assert classifier1.params == classifier2.params == classifier3.params
     assert classifier2.other_metadata == classifier3.other_metadata
     os.remove(temp_filename)
+
+
+def test_reduced_precision():
+    texts = data['texts']
+    labels = data['labels']
+    classifier1 = AdeftClassifier('IR', ['HGNC:6091', 'MESH:D011839'],
+                                  random_state=1729)
+    classifier1.train(texts, labels, max_features=10)
+    temp_filename = os.path.join(SCRATCH_PATH, uuid.uuid4().hex)
+    classifier1.dump_model(temp_filename, dtype='float16')
+    classifier2 = load_model(temp_filename)
+    os.remove(temp_filename)
+    # Inference runs in float32 for models stored at reduced precision
+    assert classifier2.estimator.named_steps['logit'].coef_.dtype == \
+        np.float32
+    tfidf = classifier2.estimator.named_steps['tfidf']
+    X = tfidf.transform(texts)
+    assert X.dtype == np.float32
+    X_full = classifier1.estimator.named_steps['tfidf'].transform(texts)
+    assert abs(X - X_full).max() < 1e-3
+    assert classifier2._std.dtype == np.float32
+    agreement = classifier1.precision_agreement(texts, dtype='float16')
+    assert agreement['agreement'] > 0.95
+    assert agreement['max_probability_difference'] < 0.01
+    assert np.mean(classifier1.predict(texts) ==
+                   classifier2.predict(texts)) == agreement['agreement']
@@ -1,9 +1,12 @@
 import os
+import json
 import uuid
+import pickle
 
 from adeft.locations import TEST_RESOURCES_PATH
-from adeft.discover import AdeftMiner, load_adeft_miner_from_dict, \
-    load_adeft_miner, compose
+from adeft.util import get_candidate_fragments, get_candidate
+from adeft.discover import AdeftMiner, MultiAdeftMiner, \
+    load_adeft_miner_from_dict, load_adeft_miner, compose
 
 
 # Path to scratch directory to write files to during tests
@@ -51,21 +54,25 @@ def test_add():
                'network', 'integr', 'the']
     counts = [1]*7
     penalty = [1]*6 + [0]
-    current = miner._internal_trie
+    trie = miner._internal_trie
+    current = 0
     for penalty, token in zip(penalty, stemmed):
-        assert token in current.children
+        child = trie.child(current, trie.token_ids[token])
+        assert child >= 0
         score = 1 - penalty
-        assert current.children[token].score == score
-        current = current.children[token]
+        assert trie.score[child] == score
+        current = child
+    assert trie.longform(current) == tuple(stemmed)
     miner._add(candidate[1:])
     counts = [2]*6 + [1]
     penalty = [2]*5 + [1, 0]
-    current = miner._internal_trie
+    current = 0
     for count, penalty, token in zip(counts, penalty, stemmed):
-        assert token in current.children
+        child = trie.child(current, trie.token_ids[token])
+        assert child >= 0
         score = count - penalty
-        assert current.children[token].score == score
-        current = current.children[token]
+        assert trie.score[child] == score
+        current = child
 
 
 def test_process_texts():
@@ -102,6 +109,36 @@ def test_get_longforms():
     assert longforms[1][1] >= 0.8
 
 
+def test_best_descendent_scores():
+    """Best descendent scores are the maximum over the whole subtree
+
+    The best candidate below "response" is the internal node
+    "adaptive response", in a different branch from the leaf
+    "receptor response".
+    """
+    miner = AdeftMiner('AR')
+    for candidate, count in [(['the', 'adaptive', 'response'], 21),
+                             (['adaptive', 'response'], 21),
+                             (['receptor', 'response'], 2)]:
+        for _ in range(count):
+            miner._add(candidate)
+    longforms = miner.get_longforms(use_alignment_based_scoring=False)
+    trie = miner._internal_trie
+    for node in range(1, len(trie)):
+        subtree, descendents = [node], []
+        while subtree:
+            current = subtree.pop()
+            descendents.append(current)
+            subtree.extend(trie.children(current))
+        assert trie.best_descendent_score[node] == \
+            max(trie.score[descendent] for descendent in descendents)
+    response = trie.child(0, trie.token_ids['respons'])
+    assert trie.best_descendent_score[response] == 21
+    assert [(longform, count) for longform, count, _ in longforms] == \
+        [('adaptive response', 42), ('receptor response', 2)]
+    assert abs(longforms[1][2] - (2 - 1)/(44 - 1768/44 + 3)) < 1e-12
+
+
 def test_miner_to_dict():
     miner = AdeftMiner('INDRA')
     miner.process_texts([example_text1, example_text2,
@@ -126,6 +163,28 @@ def test_serialize_adeft_miner():
         miner2 = load_adeft_miner(f)
     assert miner.top() == miner2.top()
     assert miner.get_longforms() == miner2.get_longforms()
+    os.remove(temp_filename)
+
+
+def test_serialize_adeft_miner_binary():
+    miner = AdeftMiner('INDRA')
+    miner.process_texts([example_text1, example_text2,
+                         example_text3, example_text4])
+    temp_filename = os.path.join(SCRATCH_PATH, uuid.uuid4().hex)
+    with open(temp_filename, 'wb') as f:
+        miner.dump(f, binary=True)
+    with open(temp_filename, 'rb') as f:
+        miner2 = load_adeft_miner(f)
+    assert miner.to_dict() == miner2.to_dict()
+    assert miner.top() == miner2.top()
+    assert miner.get_longforms() == miner2.get_longforms()
+    # Json files can also be read in binary mode
+    with open(temp_filename, 'w') as f:
+        miner.dump(f)
+    with open(temp_filename, 'rb') as f:
+        miner3 = load_adeft_miner(f)
+    assert miner.to_dict() == miner3.to_dict()
+    os.remove(temp_filename)
 
 
 def test_compose_adeft_miners():
@@ -140,6 +199,240 @@ def test_compose_adeft_miners():
     combined = compose(miner1, miner2)
     print(combined)
     assert combined.top() == miner3.top()
+    # Input miners are left unchanged
+    miner4 = AdeftMiner('INDRA')
+    miner4.process_texts([example_text3, example_text4])
+    assert miner2.to_dict() == miner4.to_dict()
+    assert combined._stemmer.dump() == miner3._stemmer.dump()
+    # Nodes are moved when consuming the input miners
+    combined = compose(miner1, miner2, consume=True)
+    assert combined.to_dict() == miner3.to_dict()
+    assert combined.top() == miner3.top()
+    assert combined._stemmer.dump() == miner3._stemmer.dump()
+    assert miner1.top() == miner2.top() == []
+    trie = combined._internal_trie
+    for node in range(1, len(trie)):
+        assert trie.child(trie.parent[node], trie.token[node]) == node
+
+
+def test_process_texts_parallel():
+    texts = [example_text1, example_text2, example_text3, example_text4]*3
+    miner1 = AdeftMiner('INDRA')
+    miner1.process_texts(texts)
+    miner2 = AdeftMiner('INDRA')
+    miner2.process_texts(texts, n_jobs=3)
+    assert miner1.to_dict() == miner2.to_dict()
+    assert miner1.top() == miner2.top()
+    assert miner1.get_longforms() == miner2.get_longforms()
+
+
+def test_process_texts_batched():
+    texts = [example_text1, example_text2, example_text3, example_text4]*3
+    miner1 = AdeftMiner('INDRA')
+    for text in texts:
+        for fragment in get_candidate_fragments(text, 'INDRA'):
+            candidate, _ = get_candidate(fragment)
+            miner1._add(candidate)
+    for batch_size in [1, 5, 1000]:
+        miner2 = AdeftMiner('INDRA')
+        miner2.process_texts(texts, batch_size=batch_size)
+        assert miner1.to_dict() == miner2.to_dict()
+        assert miner1._stemmer.dump() == miner2._stemmer.dump()
+
+
+def test_process_stream():
+    texts = [example_text1, example_text2, example_text3, example_text4]*3
+    miner1 = AdeftMiner('INDRA')
+    miner1.process_texts(texts)
+    filename = os.path.join(SCRATCH_PATH, '%s.jsonl' % uuid.uuid4().hex)
+    checkpoint = os.path.join(SCRATCH_PATH, '%s.bin' % uuid.uuid4().hex)
+    try:
+        with open(filename, 'w') as f:
+            for text in texts:
+                f.write(json.dumps({'text': text}) + '\n')
+        miner2 = AdeftMiner('INDRA')
+        assert miner2.process_stream(filename) == len(texts)
+        assert miner2.to_dict() == miner1.to_dict()
+
+        # Interrupt processing of a stream and resume from the checkpoint
+        def interrupted():
+            for text in texts[:7]:
+                yield text
+            raise KeyboardInterrupt
+        miner3 = AdeftMiner('INDRA')
+        try:
+            miner3.process_stream(interrupted(), checkpoint_path=checkpoint,
+                                  checkpoint_interval=2, batch_size=3)
+        except KeyboardInterrupt:
+            pass
+        miner4 = AdeftMiner('INDRA')
+        assert miner4.process_stream(iter(texts), checkpoint_path=checkpoint,
+                                     checkpoint_interval=2,
+                                     batch_size=3) == len(texts)
+        assert miner4.to_dict() == miner1.to_dict()
+        os.remove(checkpoint)
+        # Resume reading a file from the stored position
+        miner5 = AdeftMiner('INDRA')
+        miner5.process_stream(texts[:4], checkpoint_path=checkpoint)
+        miner5 = AdeftMiner('INDRA')
+        miner5.process_stream(filename, checkpoint_path=checkpoint)
+        assert miner5.to_dict() == miner1.to_dict()
+    finally:
+        for path in [filename, checkpoint]:
+            if os.path.exists(path):
+                os.remove(path)
+
+
+def test_get_longforms_deep_trie():
+    # Deeper than the default recursion limit
+    text = ' '.join('token%s' % i for i in range(2000)) + ' (INDRA)'
+    miner = AdeftMiner('INDRA', window=len(text))
+    miner.process_texts([text, text])
+    longforms = miner.get_longforms(max_length=None, cutoff=-1,
+                                    use_alignment_based_scoring=False)
+    assert len(longforms) == 1
+    assert longforms[0][0].startswith('token0 token1')
+    assert longforms[0][1] == 2
+
+
+def test_top_limit():
+    miner = AdeftMiner('INDRA')
+    miner.process_texts([example_text1, example_text2, example_text3,
+                         example_text4]*2 + [example_text2])
+    for params in [{}, {'use_alignment_based_scoring': False},
+                   {'max_length': None, 'smoothing_param': 1}]:
+        top = miner.top(**params)
+        for limit in [0, 1, 3, 10, 100]:
+            assert miner.top(limit=limit, **params) == top[:limit]
+
+
+def test_incremental_scoring():
+    texts = [example_text1, example_text2, example_text3, example_text4] + \
+        ['Assembler %s of model %s (INDRA)' % (i, i % 3) for i in range(30)]
+    miner1 = AdeftMiner('INDRA')
+    miner1.process_texts(texts)
+    miner1.compute_alignment_scores()
+    miner1.top()
+    trie = miner1._internal_trie
+    assert trie.num_propagated == len(trie)
+    miner1.process_texts([example_text2,
+                          'The new Dynamical Reasoning Assembler (INDRA)'])
+    assert 0 < len(trie.dirty) < len(trie) // 4
+    miner2 = AdeftMiner('INDRA')
+    miner2.process_texts(texts + [example_text2,
+                                  'The new Dynamical Reasoning Assembler'
+                                  ' (INDRA)'])
+    assert miner1.top() == miner2.top()
+    assert miner1.get_longforms() == miner2.get_longforms()
+    miner1.compute_alignment_scores()
+    miner2.compute_alignment_scores()
+    for field in ['alignment_score', 'best_ancestor_score',
+                  'best_descendent_score']:
+        assert getattr(trie, field) == getattr(miner2._internal_trie, field)
+    # Alignment scores are recomputed for all nodes with new parameters
+    miner1.compute_alignment_scores(alpha=0.5)
+    miner2.compute_alignment_scores(alpha=0.5)
+    assert trie.alignment_score == miner2._internal_trie.alignment_score
+
+
+def test_lazy_alignment_scores():
+    texts = [example_text1, example_text2, example_text3, example_text4] + \
+        ['Assembler %s of model %s (INDRA)' % (i, i % 3) for i in range(30)]
+    eager = AdeftMiner('INDRA')
+    eager.process_texts(texts)
+    eager.compute_alignment_scores()
+    for params in [{}, {'max_length': 3}, {'max_length': None},
+                   {'cutoff': 0.5}, {'cutoff': -1},
+                   {'use_alignment_based_scoring': False}]:
+        lazy = AdeftMiner('INDRA')
+        lazy.process_texts(texts)
+        assert lazy.get_longforms(**params) == eager.get_longforms(**params)
+        if params == {'max_length': 3}:
+            # Candidates longer than max_length are not aligned
+            assert 0 in lazy._internal_trie.aligned
+    for limit in [None, 1, 5]:
+        lazy = AdeftMiner('INDRA')
+        lazy.process_texts(texts)
+        assert lazy.top(limit=limit) == eager.top(limit=limit)
+    aligned = lazy._internal_trie.aligned
+    assert all(score == eager._internal_trie.alignment_score[node]
+               for node, score in enumerate(lazy._internal_trie
+                                            .alignment_score)
+               if aligned[node])
+
+
+def test_node_statistics():
+    miner = AdeftMiner('INDRA')
+    miner.process_texts([example_text1, example_text2, example_text3,
+                         example_text4, example_text2])
+    statistics = miner.node_statistics()
+    trie = miner._internal_trie
+    assert len(statistics['count']) == len(trie)
+    for node in range(1, len(trie)):
+        assert statistics['depth'][node] == len(trie.longform(node))
+        path = []
+        current = node
+        while current > 0:
+            path.append(current)
+            current = trie.parent[current]
+        assert statistics['best_ancestor_score'][node] == \
+            max(trie.score[ancestor] for ancestor in path)
+        assert statistics['best_descendent_score'][node] >= trie.score[node]
+    assert statistics['best_descendent_score'][0] == \
+        max(statistics['score'][1:])
+    # Arrays are copies, so the trie can still grow
+    miner.process_texts(['The new Dynamical Reasoning Assembler (INDRA)'])
+    assert len(miner.node_statistics()['count']) > len(statistics['count'])
+
+
+def test_parallel_alignment_scores():
+    texts = [example_text1, example_text2, example_text3, example_text4]
+    miner1 = AdeftMiner('INDRA')
+    miner1.process_texts(texts)
+    miner1.compute_alignment_scores()
+    miner2 = AdeftMiner('INDRA')
+    miner2.process_texts(texts)
+    miner2.compute_alignment_scores(n_jobs=2)
+    assert miner1._internal_trie.alignment_score == \
+        miner2._internal_trie.alignment_score
+    # Only new candidates are scored by the workers
+    new_text = 'Reasoning Assembler for Dynamical Networks (INDRA)'
+    miner1.process_texts([new_text])
+    miner2.process_texts([new_text])
+    assert miner1.get_longforms() == miner2.get_longforms(n_jobs=2)
+    miner1.compute_alignment_scores()
+    assert miner1._internal_trie.alignment_score == \
+        miner2._internal_trie.alignment_score
+
+
+def test_multi_adeft_miner():
+    texts = [example_text1, example_text2, example_text3, example_text4,
+             'The insulin receptor (IR) and the Integrated Network and'
+             ' Dynamical Reasoning Assembler (INDRA) were studied. Insulin'
+             ' receptors (IR) are in infrared (IR) images.']*3
+    shortforms = ['INDRA', 'IR', 'ER']
+    for n_jobs in [1, 2]:
+        multi_miner = MultiAdeftMiner(shortforms)
+        multi_miner.process_texts(texts, n_jobs=n_jobs, batch_size=4)
+        for shortform in shortforms:
+            miner = AdeftMiner(shortform)
+            miner.process_texts(texts)
+            assert multi_miner[shortform].to_dict() == miner.to_dict()
+            assert multi_miner[shortform].top() == miner.top()
+            assert multi_miner[shortform].get_longforms() == \
+                miner.get_longforms()
+    assert multi_miner['ER'].top() == []
+    assert 'insulin' in multi_miner._stem_cache
+
+
+def test_pickle_stemmer():
+    miner = AdeftMiner('INDRA')
+    miner.process_texts([example_text1, example_text2])
+    stemmer = pickle.loads(pickle.dumps(miner._stemmer))
+    assert stemmer.dump() == miner._stemmer.dump()
+    stemmer.update(miner._stemmer)
+    assert stemmer.counts['integr']['integrated'] == \
+        2*miner._stemmer.counts['integr']['integrated']
 
 
 def test_prune():
@@ -151,3 +444,37 @@ def test_prune():
     pruned_candidates = [candidate for candidate, _, _ in miner.top()]
     assert pruned_candidates == [candidate for candidate in candidates if
                                  len(candidate.split()) <= 5]
+
+
+def test_prune_rare():
+    texts = ([example_text1, example_text2, example_text3]*5 +
+             ['A model %s of the assembler %s (INDRA)' % (i, i % 7)
+              for i in range(60)])
+    miner1 = AdeftMiner('INDRA')
+    miner1.process_texts(texts)
+    counts1 = _candidate_counts(miner1)
+    for params in [{'max_nodes': 40}, {'max_memory': 20000}]:
+        miner2 = AdeftMiner('INDRA', **params)
+        miner2.process_texts(texts, batch_size=10)
+        trie = miner2._internal_trie
+        if 'max_nodes' in params:
+            assert len(trie) <= 40
+        else:
+            assert trie.nbytes() <= 20000
+        assert miner2.count_error_bound > 0
+        counts2 = _candidate_counts(miner2)
+        assert counts2
+        for longform, count in counts2.items():
+            assert count <= counts1[longform] <= \
+                count + miner2.count_error_bound
+        # Structure of the trie remains consistent after pruning
+        for node in range(1, len(trie)):
+            assert trie.child(trie.parent[node], trie.token[node]) == node
+        assert set(miner2._stemmer.counts) == set(trie.tokens)
+        assert miner2.top()[0] == miner1.top()[0]
+
+
+def _candidate_counts(miner):
+    trie = miner._internal_trie
+    return {trie.longform(node): trie.count[node]
+            for node in range(1, len(trie))}
@@ -0,0 +1,42 @@
+import numpy as np
+
+from adeft.modeling.duplicates import collapse_duplicates
+
+
+texts = ['The insulin receptor binds insulin and activates signaling.',
+         'Ionizing radiation causes double strand breaks in DNA.',
+         'The insulin receptor binds insulin and activates signaling.',
+         'The insulin receptor binds insulin and activates signaling.',
+         'Ionizing radiation causes double strand breaks in DNA.',
+         'Infrared spectroscopy measures vibrational modes of molecules.']
+labels = ['HGNC:6091', 'MESH:D011839', 'HGNC:6091', 'ungrounded',
+          'MESH:D011839', 'ungrounded']
+
+
+def test_collapse_exact_duplicates():
+    new_texts, new_labels, sample_weight, groups = \
+        collapse_duplicates(texts, labels)
+    assert new_texts == [texts[0], texts[1], texts[0], texts[5]]
+    assert new_labels == ['HGNC:6091', 'MESH:D011839', 'ungrounded',
+                          'ungrounded']
+    assert np.array_equal(sample_weight, [2, 2, 1, 1])
+    # Identical texts with different labels share a group
+    assert groups[0] == groups[2]
+    assert len(set(groups)) == 3
+
+
+def test_collapse_near_duplicates():
+    near = ('The insulin receptor binds insulin and activates downstream'
+            ' signaling in many cell types through IRS proteins.')
+    other = ('The insulin receptor binds insulin and activates downstream'
+             ' signaling in many cell types through IRS proteins!')
+    unrelated = 'Ionizing radiation causes double strand breaks in DNA.'
+    _, _, sample_weight, groups = \
+        collapse_duplicates([near, other, unrelated], ['a', 'a', 'b'])
+    assert np.array_equal(sample_weight, [1, 1, 1])
+    assert len(set(groups)) == 3
+    _, _, _, groups = \
+        collapse_duplicates([near, other, unrelated], ['a', 'a', 'b'],
+                            near_duplicates=True)
+    assert groups[0] == groups[1]
+    assert groups[0] != groups[2]
@@ -0,0 +1,135 @@
+import os
+import json
+import uuid
+import numpy as np
+from nose.plugins.attrib import attr
+from sklearn.feature_extraction.text import TfidfVectorizer
+
+from adeft.locations import TEST_RESOURCES_PATH
+from adeft.modeling.classify import AdeftClassifier
+from adeft.modeling.ngram_stats import NgramStatistics, \
+    load_ngram_statistics
+
+
+SCRATCH_PATH = os.path.join(TEST_RESOURCES_PATH, 'scratch')
+
+
+with open(os.path.join(TEST_RESOURCES_PATH,
+                       'example_training_data.json'), 'r') as f:
+    data = json.load(f)
+
+
+def test_fit_vectorizer():
+    texts = data['texts']
+    stop = ['the', 'of', 'ir']
+    stats = NgramStatistics(ngram_range=(1, 2), stop_words=stop)
+    assert stats.update(texts) == len(set(texts))
+    # Texts already counted are skipped
+    assert stats.update(texts[:10]) == 0
+    tfidf = TfidfVectorizer(ngram_range=(1, 2), stop_words=stop)
+    expected = tfidf.fit_transform(list(set(texts)))
+    vectorizer = TfidfVectorizer(ngram_range=(1, 2), stop_words=stop)
+    stats.fit_vectorizer(vectorizer)
+    assert vectorizer.vocabulary_ == tfidf.vocabulary_
+    assert np.allclose(vectorizer.idf_, tfidf.idf_)
+    assert np.allclose(vectorizer.transform(list(set(texts))).toarray(),
+                       expected.toarray())
+    # Unigram vectorizers can be produced from bigram statistics
+    vectorizer = TfidfVectorizer(ngram_range=(1, 1), max_features=10,
+                                 stop_words=stop)
+    stats.fit_vectorizer(vectorizer)
+    assert len(vectorizer.vocabulary_) == 10
+    assert all(' ' not in term for term in vectorizer.vocabulary_)
+
+
+def test_fit_transform():
+    texts = data['texts']
+    stop = ['the', 'of', 'ir']
+    stats = NgramStatistics(ngram_range=(1, 2), stop_words=stop)
+    stats.update(texts)
+    # Vectorizers are fit to the given texts only, counting duplicates
+    train = texts[:100] + texts[:10]
+    for ngram_range, max_features in [((1, 1), None), ((1, 2), 20)]:
+        tfidf = TfidfVectorizer(ngram_range=ngram_range,
+                                max_features=max_features, stop_words=stop)
+        expected = tfidf.fit_transform(train)
+        vectorizer = TfidfVectorizer(ngram_range=ngram_range,
+                                     max_features=max_features,
+                                     stop_words=stop)
+        X = stats.fit_transform(vectorizer, train)
+        assert vectorizer.vocabulary_ == tfidf.vocabulary_
+        assert np.array_equal(vectorizer.idf_, tfidf.idf_)
+        assert np.allclose(X.toarray(), expected.toarray())
+        assert np.allclose(vectorizer.transform(texts[100:]).toarray(),
+                           tfidf.transform(texts[100:]).toarray())
+    try:
+        stats.fit_transform(vectorizer, ['a text that was not counted'])
+        assert False
+    except ValueError:
+        pass
+
+
+def test_merge_and_serialize():
+    texts = list(set(data['texts']))
+    stats1 = NgramStatistics()
+    stats1.update(texts[:50])
+    stats2 = NgramStatistics()
+    stats2.update(texts[50:])
+    stats1.merge(stats2)
+    full = NgramStatistics()
+    full.update(texts)
+    assert stats1.num_texts == full.num_texts
+    assert stats1.document_counts == full.document_counts
+    assert stats1.term_counts == full.term_counts
+    counts1, terms1 = stats1.count_matrix(texts)
+    counts, terms = full.count_matrix(texts)
+    assert terms1 == terms
+    assert (counts1 != counts).nnz == 0
+    try:
+        stats1.merge(stats2)
+        assert False
+    except ValueError:
+        pass
+    filepath = os.path.join(SCRATCH_PATH, '%s.gz' % uuid.uuid4().hex)
+    try:
+        full.dump(filepath)
+        loaded = load_ngram_statistics(filepath)
+    finally:
+        os.remove(filepath)
+    assert loaded.digests == full.digests
+    assert loaded.document_counts == full.document_counts
+    counts1, terms1 = loaded.count_matrix(texts)
+    assert terms1 == terms
+    assert (counts1 != counts).nnz == 0
+    # New texts can be added to a loaded store
+    assert loaded.update(['insulin receptor signaling pathway']) == 1
+
+
+@attr('slow')
+def test_cv_ngram_stats():
+    texts = data['texts']
+    labels = data['labels']
+    classifier = AdeftClassifier('IR', ['HGNC:6091', 'MESH:D011839'],
+                                 random_state=1729)
+    params = {'C': [1.0, 10.0], 'max_features': [10]}
+    classifier.cv(texts, labels, param_grid=params, cv=2)
+    cv_results = classifier.cv_results
+    coef = classifier.estimator.named_steps['logit'].coef_
+    stats = NgramStatistics(stop_words=classifier.stop)
+    # Texts outside the training set must not affect the results
+    stats.update(texts[:50] + ['insulin receptor signaling pathway'])
+    classifier.cv(texts, labels, param_grid=params, cv=2, ngram_stats=stats)
+    assert stats.num_texts == len(set(texts)) + 1
+    assert classifier.stats['f1']['mean'] > 0.5
+    assert len(classifier.estimator.named_steps['tfidf'].vocabulary_) == 10
+    for name in ['mean_test_f1', 'mean_test_pr', 'mean_test_rc']:
+        assert np.array_equal(classifier.cv_results[name], cv_results[name])
+    assert np.array_equal(classifier.estimator.named_steps['logit'].coef_,
+                          coef)
+    # The store must contain the ngram ranges of the grid
+    try:
+        classifier.cv(texts, labels, param_grid={'ngram_range': [(1, 3)]},
+                      cv=2, ngram_stats=stats)
+        assert False
+    except ValueError:
+        pass
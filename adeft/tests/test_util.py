@@ -1,4 +1,5 @@
-from adeft.util import get_candidate, get_candidate_fragments
+from adeft.util import get_candidate, get_candidate_fragments, \
+    get_candidate_fragments_multi
 
 
 text1 = ('Integrated Network and Dynamical Reasoning Assembler'
@@ -59,3 +60,17 @@ def test_get_candidate_fragments():
     assert not get_candidate_fragments('Integrated Network'
                                        'and dynamical reasoning assembler',
                                        'INDRA')
+
+
+def test_get_candidate_fragments_multi():
+    text = ('The insulin receptor (IR) and ionizing radiation (IR) act on'
+            ' the endoplasmic reticulum (ER) (IR) in the Integrated Network'
+            ' and Dynamical Reasoning Assembler (INDRA) (IR) (I) system.')
+    shortforms = ['IR', 'ER', 'INDRA', 'I', 'XYZ']
+    result = get_candidate_fragments_multi(text, shortforms)
+    expected = {shortform: get_candidate_fragments(text, shortform)
+                for shortform in shortforms}
+    assert result == {shortform: fragments
+                      for shortform, fragments in expected.items()
+                      if fragments}
+    assert 'XYZ' not in result
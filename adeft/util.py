@@ -49,6 +49,64 @@ def get_candidate_fragments(text, shortform, window=100):
     return result
 
 
+def get_candidate_fragments_multi(text, shortforms, window=100):
+    """Return candidate longform fragments for several shortforms at once
+
+    Text is scanned a single time for defining patterns of any of the
+    shortforms. Gives the same fragments as calling get_candidate_fragments
+    for each shortform separately.
+
+    Parameters
+    ----------
+    text : str
+        Text to search for defining patterns (DP)
+    shortforms : iterable of str or :py:class:`re.Pattern`
+        Shortforms to disambiguate, or a compiled pattern returned by
+        defining_pattern_regex. Compiling the pattern once saves time when
+        processing many texts.
+    window : Optional[int]
+        Specifies range of characters before a defining pattern (DP)
+        to consider when finding longforms. See get_candidate_fragments.
+        Default: 100
+
+    Returns
+    -------
+    result : dict
+        Maps shortforms with at least one candidate fragment in the text to
+        lists of fragments, in the order they appear in the text.
+    """
+    if isinstance(shortforms, re.Pattern):
+        pattern = shortforms
+    else:
+        pattern = defining_pattern_regex(shortforms)
+    # The end of the previous DP is tracked separately for each shortform
+    end_previous = {}
+    result = {}
+    for match in pattern.finditer(text):
+        shortform = match.group(1)
+        span = match.span()
+        left = max(end_previous.get(shortform, -1)+1, span[0]-window)
+        fragment = text[left:span[0]]
+        if not fragment:
+            continue
+        result.setdefault(shortform, []).append(fragment)
+        end_previous[shortform] = span[1]
+    return result
+
+
+def defining_pattern_regex(shortforms):
+    """Return compiled pattern matching defining patterns of shortforms
+
+    The matched shortform is captured in the first group.
+    """
+    # Longer shortforms come first so that no alternative is a prefix of an
+    # alternative that follows it
+    shortforms = sorted(set(shortforms), key=lambda x: (-len(x), x))
+    return re.compile(r'\s\((%s)\)'
+                      % '|'.join(re.escape(shortform)
+                                 for shortform in shortforms))
+
+
 def get_candidate(fragment):
     """Return tokens in candidate fragment up until last excluded word
 
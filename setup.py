@@ -45,7 +45,7 @@ setup(name='adeft',
           'Programming Language :: Python :: 3.8'
       ],
       packages=find_packages(),
-      install_requires=['nltk', 'scikit-learn>=0.20.0', 'wget',
+      install_requires=['nltk', 'scikit-learn>=1.0.0', 'wget',
                         'requests', 'flask'],
       extras_require={'test': ['nose', 'coverage']},
       keywords=['nlp', 'biology', 'disambiguation'],